@@ -1,9 +1,109 @@
-from basic import BasicBenchmark
+import json
+import platform
+import sys
+import time
+from optparse import OptionParser
 
+from lxml import etree
+
+from arrays import ArrayBenchmark
+from basic import BasicBenchmark, TextBackendBenchmark
+from batch import BatchBenchmark
+from decoder import DecoderBenchmark
+from harness import compare
+from records import RecordBenchmark
+from shapes import (DeepNestingBenchmark, LargeStringBenchmark,
+                    LongListBenchmark, ObjectGraphBenchmark,
+                    WideDictBenchmark)
+
+from exemelopy.__version__ import __version__
+
+
+BENCHMARKS = (
+    WideDictBenchmark,
+    DeepNestingBenchmark,
+    LongListBenchmark,
+    LargeStringBenchmark,
+    ObjectGraphBenchmark,
+    BasicBenchmark,
+    TextBackendBenchmark,
+    DecoderBenchmark,
+    RecordBenchmark,
+    BatchBenchmark,
+    ArrayBenchmark,
+    )
+
+
+def main(args=None):
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('-k', '--select', metavar='TEXT',
+                      help='only run benchmarks whose key contains TEXT')
+    parser.add_option('-o', '--output', metavar='FILE',
+                      help='write the results to FILE as JSON')
+    parser.add_option('-b', '--baseline', metavar='FILE',
+                      help='compare the results with those saved in FILE')
+    parser.add_option('-t', '--threshold', type='float', default=0.1,
+                      help='the fraction slower than the baseline which '
+                      'counts as a regression [default: %default]')
+    parser.add_option('--min-time', type='float', metavar='SECONDS',
+                      help='how long to run each benchmark for')
+    options, _ = parser.parse_args(args)
 
-def main():
     print 'Running benchmarks, please wait...'
-    BasicBenchmark().run()
+    results = []
+    for benchmark in BENCHMARKS:
+        benchmark = benchmark()
+        if options.min_time is not None:
+            benchmark.min_time = options.min_time
+
+        for result in benchmark.run(options.select):
+            print _format(result)
+            results.append(result)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({'environment': _environment(), 'results': results},
+                      f, indent=2, sort_keys=True)
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)['results']
+
+        changes, slower = compare(results, baseline, options.threshold)
+        print
+        print 'Compared with %s:' % options.baseline
+        for key, ratio in changes:
+            print '%-60s %+7.1f%%%s' % (key, (ratio - 1) * 100,
+                                        key in slower and '  SLOWER' or '')
+
+        if slower:
+            print '%d of %d benchmarks are slower' % (len(slower),
+                                                      len(changes))
+            return 1
+
+    return 0
+
+
+def _format(result):
+    latency = result['latency']
+    throughput = result['bytes_per_sec']
+    return '%-60s %12.1f ops/s %9s  p50 %9.3f ms  p99 %9.3f ms' % (
+        result['key'], result['ops_per_sec'],
+        throughput and '%.1f MB/s' % (throughput / 1e6) or '',
+        latency['p50'] * 1000, latency['p99'] * 1000)
+
+
+def _environment():
+    return {
+        'exemelopy': __version__,
+        'lxml': '.'.join(map(str, etree.LXML_VERSION)),
+        'libxml2': '.'.join(map(str, etree.LIBXML_VERSION)),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        }
+
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
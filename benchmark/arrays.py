@@ -0,0 +1,50 @@
+import os
+import sys
+from array import array
+from harness import Benchmark
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+BASE_PATH = '/'.join(os.path.dirname(
+    os.path.abspath(__file__)).split('/')[0:-1])
+
+if BASE_PATH not in sys.path:
+    sys.path.insert(1, BASE_PATH)
+
+from exemelopy import XMLEncoder
+
+
+class ArrayBenchmark(Benchmark):
+    """Encodes ``input_`` numbers held in an ``array.array``, and in
+    NumPy arrays when NumPy is installed."""
+
+    repeat = 1
+
+    def input(self):
+        return [10 ** 7]
+
+    def benchmarks(self):
+        names = super(ArrayBenchmark, self).benchmarks()
+        if numpy is None:
+            # skipped, rather than reported as taking no time
+            names = [name for name in names
+                     if not name.startswith('bench_ndarray_')]
+        return names
+
+    def prepare(self, input_):
+        self.array = {'values': array('d', xrange(input_))}
+        if numpy is not None:
+            self.float64 = {'values': numpy.arange(input_, dtype='float64')}
+            self.int64 = {'values': numpy.arange(input_, dtype='int64')}
+
+    def bench_array(self, input_):
+        return XMLEncoder(self.array).to_string()
+
+    def bench_ndarray_float64(self, input_):
+        return XMLEncoder(self.float64).to_string()
+
+    def bench_ndarray_int64(self, input_):
+        return XMLEncoder(self.int64).to_string()
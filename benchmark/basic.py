@@ -2,7 +2,7 @@ import os
 import sys
 import datetime
 from collections import MutableMapping as DictMixin
-from unitbench import Benchmark
+from harness import Benchmark
 
 BASE_PATH = '/'.join(os.path.dirname(
     os.path.abspath(__file__)).split('/')[0:-1])
@@ -43,73 +43,77 @@ class ComplexObject(DictMixin):
 
 
 class BasicBenchmark(Benchmark):
+    """Encodes values of each shape with the default 'lxml'
+    backend."""
+
+    backend = 'lxml'
 
     def input(self):
         return [100]
 
     def bench_None(self, input_):
         for _ in xrange(input_):
-            XMLEncoder(None).to_string()
+            XMLEncoder(None, backend=self.backend).to_string()
 
     def bench_Basic_Integer(self, input_):
         for _ in xrange(input_):
-            XMLEncoder(123).to_string()
+            XMLEncoder(123, backend=self.backend).to_string()
 
     def bench_Basic_Float(self, input_):
         for _ in xrange(input_):
-            XMLEncoder(1.23).to_string()
+            XMLEncoder(1.23, backend=self.backend).to_string()
 
     def bench_Basic_String(self, input_):
         for _ in xrange(input_):
-            XMLEncoder('simple string').to_string()
+            XMLEncoder('simple string', backend=self.backend).to_string()
 
     def bench_Basic_List(self, input_):
         for _ in xrange(input_):
-            XMLEncoder([1, 2, 3, 4, 5]).to_string()
+            XMLEncoder([1, 2, 3, 4, 5], backend=self.backend).to_string()
 
     def bench_Basic_Set(self, input_):
         for _ in xrange(input_):
-            XMLEncoder(set([1, 2, 3, 4, 5])).to_string()
+            XMLEncoder(set([1, 2, 3, 4, 5]), backend=self.backend).to_string()
 
     def bench_Basic_Tuple(self, input_):
         for _ in xrange(input_):
-            XMLEncoder((1, 2, 3, 4, 5)).to_string()
+            XMLEncoder((1, 2, 3, 4, 5), backend=self.backend).to_string()
 
     def bench_Basic_Generator(self, input_):
         data = list(range(10))
         for _ in xrange(input_):
-            XMLEncoder(data).to_string()
+            XMLEncoder(data, backend=self.backend).to_string()
 
     def bench_Empty_Dict(self, input_):
         for _ in xrange(input_):
-            XMLEncoder({}).to_string()
+            XMLEncoder({}, backend=self.backend).to_string()
 
     def bench_Basic_Dict(self, input_):
         for _ in xrange(input_):
-            XMLEncoder({'a': 1}).to_string()
+            XMLEncoder({'a': 1}, backend=self.backend).to_string()
 
     def bench_True(self, input_):
         for _ in xrange(input_):
-            XMLEncoder(True).to_string()
+            XMLEncoder(True, backend=self.backend).to_string()
 
     def bench_False(self, input_):
         for _ in xrange(input_):
-            XMLEncoder(False).to_string()
+            XMLEncoder(False, backend=self.backend).to_string()
 
     def bench_Simple_Object(self, input_):
         data = SimpleObject()
         for _ in xrange(input_):
-            XMLEncoder(data).to_string()
+            XMLEncoder(data, backend=self.backend).to_string()
 
     def bench_Complex_Object(self, input_):
         data = ComplexObject()
         for _ in xrange(input_):
-            XMLEncoder(data).to_string()
+            XMLEncoder(data, backend=self.backend).to_string()
 
     def bench_Date_Object(self, input_):
         data = datetime.datetime(2010, 2, 1, 0, 0)
         for _ in xrange(input_):
-            XMLEncoder(data).to_string()
+            XMLEncoder(data, backend=self.backend).to_string()
 
     def bench_Large_Object(self, input_):
         data = {}
@@ -129,4 +133,11 @@ class BasicBenchmark(Benchmark):
                     }
 
         for _ in xrange(input_):
-            XMLEncoder(data).to_string()
+            XMLEncoder(data, backend=self.backend).to_string()
+
+
+class TextBackendBenchmark(BasicBenchmark):
+    """The same shapes as ``BasicBenchmark``, encoded with the
+    'text' backend."""
+
+    backend = 'text'
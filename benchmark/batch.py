@@ -0,0 +1,68 @@
+import os
+import sys
+import datetime
+from harness import Benchmark
+
+BASE_PATH = '/'.join(os.path.dirname(
+    os.path.abspath(__file__)).split('/')[0:-1])
+
+if BASE_PATH not in sys.path:
+    sys.path.insert(1, BASE_PATH)
+
+from exemelopy import EncoderConfig, encode_many
+
+
+def large_object():
+    data = {}
+    for i in xrange(10):
+        data[i] = {
+            'a': list(x for x in xrange(50)),
+            'b': set(x for x in xrange(50)),
+            'c': tuple(x for x in xrange(50)),
+            'e': datetime.datetime.utcnow(),
+            'f': "Hello World " * 500,
+            'g': True,
+            'h': False,
+            'i': None,
+            }
+    return data
+
+
+class BatchBenchmark(Benchmark):
+    """Encodes ``input_`` separate Large_Object-style documents,
+    serially and then across an increasing number of workers."""
+
+    def input(self):
+        return [200]
+
+    def bench_Serial(self, input_):
+        config = EncoderConfig()
+        data = large_object()
+        for _ in xrange(input_):
+            config.dumps(data)
+
+    def bench_1_Process(self, input_):
+        data = large_object()
+        for _ in encode_many((data for _ in xrange(input_)), workers=1):
+            pass
+
+    def bench_2_Processes(self, input_):
+        data = large_object()
+        for _ in encode_many((data for _ in xrange(input_)), workers=2):
+            pass
+
+    def bench_4_Processes(self, input_):
+        data = large_object()
+        for _ in encode_many((data for _ in xrange(input_)), workers=4):
+            pass
+
+    def bench_8_Processes(self, input_):
+        data = large_object()
+        for _ in encode_many((data for _ in xrange(input_)), workers=8):
+            pass
+
+    def bench_4_Threads(self, input_):
+        data = large_object()
+        for _ in encode_many((data for _ in xrange(input_)),
+                             workers=4, threads=True):
+            pass
@@ -0,0 +1,72 @@
+import os
+import sys
+import datetime
+from harness import Benchmark
+
+BASE_PATH = '/'.join(os.path.dirname(
+    os.path.abspath(__file__)).split('/')[0:-1])
+
+if BASE_PATH not in sys.path:
+    sys.path.insert(1, BASE_PATH)
+
+from exemelopy import XMLEncoder, loads
+
+
+def large_object():
+    data = {}
+    for i in xrange(10):
+        data[i] = {}
+        for j in xrange(10):
+            data[i][j] = {
+                'a': list(x for x in xrange(50)),
+                'b': set(x for x in xrange(50)),
+                'c': tuple(x for x in xrange(50)),
+                'd': (x for x in xrange(50)),
+                'e': datetime.datetime.utcnow(),
+                'f': "Hello World " * 500,
+                'g': True,
+                'h': False,
+                'i': None,
+                }
+    return data
+
+
+class DecoderBenchmark(Benchmark):
+    """Decodes documents of each shape, encoded before timing."""
+
+    def input(self):
+        return [100]
+
+    def prepare(self, input_):
+        self.documents = dict(
+            (name, XMLEncoder(data).to_string()) for name, data in (
+                ('None', None),
+                ('Basic_String', 'simple string'),
+                ('Basic_List', [1, 2, 3, 4, 5]),
+                ('Basic_Dict', {'a': 1}),
+                ('Date_Object', datetime.datetime(2010, 2, 1, 0, 0)),
+                ('Large_Object', large_object()),
+                ))
+
+    def _decode(self, name, times):
+        data = self.documents[name]
+        for _ in xrange(times):
+            loads(data)
+
+    def bench_None(self, input_):
+        self._decode('None', input_)
+
+    def bench_Basic_String(self, input_):
+        self._decode('Basic_String', input_)
+
+    def bench_Basic_List(self, input_):
+        self._decode('Basic_List', input_)
+
+    def bench_Basic_Dict(self, input_):
+        self._decode('Basic_Dict', input_)
+
+    def bench_Date_Object(self, input_):
+        self._decode('Date_Object', input_)
+
+    def bench_Large_Object(self, input_):
+        self._decode('Large_Object', input_)
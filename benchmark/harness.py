@@ -0,0 +1,130 @@
+import gc
+import math
+import time
+
+
+class Benchmark(object):
+    """Times each ``bench_*`` method with each value returned by
+    ``input``.
+
+    Each method is called repeatedly with the same input, after
+    ``prepare``, until it has run for ``min_time`` seconds and at
+    least ``repeat`` times, and each call is timed on its own. A call
+    counts as ``operations(input_)`` operations; a method which
+    returns the encoded output also has its throughput in bytes
+    measured.
+    """
+
+    repeat = 3
+    min_time = 0.5
+    max_calls = 1000
+
+    def input(self):
+        return [1]
+
+    def prepare(self, input_):
+        pass
+
+    def operations(self, input_):
+        return input_
+
+    def benchmarks(self):
+        return sorted(name for name in dir(self)
+                      if name.startswith('bench_'))
+
+    def run(self, select=None):
+        """Returns a result for each benchmark and input, only
+        running benchmarks whose key contains ``select``."""
+        results = []
+
+        for input_ in self.input():
+            prepared = False
+
+            for name in self.benchmarks():
+                key = '%s.%s[%s]' % (self.__class__.__name__, name[6:],
+                                     input_)
+                if select and select not in key:
+                    continue
+
+                if not prepared:
+                    self.prepare(input_)
+                    prepared = True
+
+                results.append(self._measure(key, getattr(self, name),
+                                             input_))
+
+        return results
+
+    def _measure(self, key, bench, input_):
+        output = bench(input_)  # warm up, and find the output's size
+        size = isinstance(output, str) and len(output) or None
+
+        samples = []
+        elapsed = 0.0
+        enabled = gc.isenabled()
+        gc.collect()
+        gc.disable()
+        try:
+            while (len(samples) < self.repeat
+                   or elapsed < self.min_time
+                   and len(samples) < self.max_calls):
+                started = time.time()
+                bench(input_)
+                sample = time.time() - started
+                samples.append(sample)
+                elapsed += sample
+        finally:
+            if enabled:
+                gc.enable()
+
+        operations = self.operations(input_)
+        mean = elapsed / len(samples)
+        latencies = sorted(sample / operations for sample in samples)
+
+        return {
+            'key': key,
+            'input': input_,
+            'calls': len(samples),
+            'ops_per_sec': mean and operations / mean,
+            'bytes_per_sec': size and mean and size / mean,
+            'latency': {
+                'min': latencies[0],
+                'p50': percentile(latencies, 50),
+                'p90': percentile(latencies, 90),
+                'p99': percentile(latencies, 99),
+                'max': latencies[-1],
+                },
+            }
+
+
+def percentile(values, percent):
+    """Returns the ``percent`` percentile of the sorted ``values``,
+    by the nearest rank."""
+    rank = int(math.ceil(percent / 100.0 * len(values))) - 1
+    return values[max(0, min(rank, len(values) - 1))]
+
+
+def compare(results, baseline, threshold=0.1):
+    """Compares ``results`` with those in ``baseline`` by key,
+    returning ``(key, ratio)`` for each benchmark in both, and the
+    keys of those more than ``threshold`` slower.
+
+    ``ratio`` is the speed of the result relative to the baseline,
+    taken from the median latency, which is steadier than the mean
+    when a few calls are held up by something else.
+    """
+    previous = dict((result['key'], result) for result in baseline)
+    changes = []
+    slower = []
+
+    for result in results:
+        before = previous.get(result['key'])
+        if not before or not result['latency']['p50']:
+            continue
+
+        ratio = before['latency']['p50'] / result['latency']['p50']
+        changes.append((result['key'], ratio))
+        if ratio < 1 - threshold:
+            slower.append(result['key'])
+
+    return changes, slower
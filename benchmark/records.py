@@ -0,0 +1,41 @@
+import os
+import sys
+from harness import Benchmark
+
+BASE_PATH = '/'.join(os.path.dirname(
+    os.path.abspath(__file__)).split('/')[0:-1])
+
+if BASE_PATH not in sys.path:
+    sys.path.insert(1, BASE_PATH)
+
+from exemelopy import EncoderConfig, RecordEncoder
+
+
+def wide_table(rows, columns=30):
+    sample = {}
+    for i in xrange(columns):
+        sample['field%d' % i] = (i % 3 == 0 and i
+                                 or i % 3 == 1 and u'value %d' % i
+                                 or i * 1.5)
+
+    return [dict(sample, field0=n) for n in xrange(rows)]
+
+
+class RecordBenchmark(Benchmark):
+    """Encodes a table of ``input_`` rows with 30 columns, using
+    ``EncoderConfig`` and then a ``RecordEncoder``, both created
+    before timing."""
+
+    def input(self):
+        return [100, 1000]
+
+    def prepare(self, input_):
+        self.data = wide_table(input_)
+        self.config = EncoderConfig(indent=False)
+        self.records = RecordEncoder(self.data[0], indent=False)
+
+    def bench_EncoderConfig(self, input_):
+        return self.config.dumps(self.data)
+
+    def bench_RecordEncoder(self, input_):
+        return self.records.dumps(self.data)
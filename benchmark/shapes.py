@@ -0,0 +1,148 @@
+import json
+import os
+import sys
+
+try:
+    from xml.etree import cElementTree as ElementTree
+except ImportError:
+    from xml.etree import ElementTree
+
+from harness import Benchmark
+
+BASE_PATH = '/'.join(os.path.dirname(
+    os.path.abspath(__file__)).split('/')[0:-1])
+
+if BASE_PATH not in sys.path:
+    sys.path.insert(1, BASE_PATH)
+
+from exemelopy import XMLEncoder
+
+
+class Node(object):
+    def __init__(self, name, children):
+        self.name = name
+        self.size = len(children)
+        self.children = children
+
+
+def wide_dict(size):
+    """A single mapping of ``size`` fields of mixed types."""
+    return dict(('field%d' % i, (i % 4 == 0 and i
+                                 or i % 4 == 1 and u'value %d' % i
+                                 or i % 4 == 2 and i * 1.5
+                                 or None))
+                for i in xrange(size))
+
+
+def deep_nesting(size):
+    """Mappings nested ``size`` levels deep."""
+    data = {'value': 0}
+    for i in xrange(1, size):
+        data = {'value': i, 'level': data}
+    return data
+
+
+def long_list(size):
+    """A list of ``size`` small records."""
+    return [{'id': i, 'name': u'row %d' % i, 'active': i % 2 == 0,
+             'tags': ['a', 'b']}
+            for i in xrange(size)]
+
+
+def large_string(size):
+    """A single string of ``size`` kilobytes with some markup
+    to escape."""
+    return {'text': (u'<p>Fish & chips</p> \xe9t\xe9 ' * 40)[:1024] * size}
+
+
+def object_graph(size):
+    """A tree of ``size`` objects, each with up to four
+    children."""
+    nodes = [Node(u'leaf %d' % i, []) for i in xrange(size)]
+    while len(nodes) > 1:
+        nodes = [Node(u'node %d' % i, nodes[i:i + 4])
+                 for i in xrange(0, len(nodes), 4)]
+    return nodes[0]
+
+
+def _json_default(value):
+    return value.__dict__
+
+
+def etree_tostring(data):
+    """Encodes ``data`` to XML with the standard library's
+    ``ElementTree``, much as exemelopy would without its
+    ``nodetype`` attributes."""
+    root = ElementTree.Element('document')
+    _etree_build(root, data)
+    return ElementTree.tostring(root, 'UTF-8')
+
+
+def _etree_build(parent, value):
+    if isinstance(value, dict):
+        for name, item in value.iteritems():
+            _etree_build(ElementTree.SubElement(parent, name), item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _etree_build(ElementTree.SubElement(parent, 'i'), item)
+    elif hasattr(value, '__dict__'):
+        _etree_build(ElementTree.SubElement(parent, type(value).__name__),
+                     value.__dict__)
+    elif value is not None:
+        parent.text = unicode(value)
+
+
+class ShapeBenchmark(Benchmark):
+    """Encodes a payload of ``shape``, for each of ``sizes``, with
+    both exemelopy backends, and with ``json`` and ``xml.etree`` from
+    the standard library for comparison. Each call encodes the
+    payload once."""
+
+    sizes = [10, 100, 1000]
+
+    def input(self):
+        return self.sizes
+
+    def prepare(self, input_):
+        self.data = self.shape(input_)
+
+    def operations(self, input_):
+        return 1
+
+    def bench_exemelopy(self, input_):
+        return XMLEncoder(self.data).to_string()
+
+    def bench_exemelopy_text(self, input_):
+        return XMLEncoder(self.data, backend='text').to_string()
+
+    def bench_json(self, input_):
+        return json.dumps(self.data, default=_json_default)
+
+    def bench_etree(self, input_):
+        return etree_tostring(self.data)
+
+
+class WideDictBenchmark(ShapeBenchmark):
+    shape = staticmethod(wide_dict)
+    sizes = [10, 1000, 10000]
+
+
+class DeepNestingBenchmark(ShapeBenchmark):
+    # beyond this the recursive json and etree encoders fail
+    shape = staticmethod(deep_nesting)
+    sizes = [10, 100, 500]
+
+
+class LongListBenchmark(ShapeBenchmark):
+    shape = staticmethod(long_list)
+    sizes = [10, 1000, 10000]
+
+
+class LargeStringBenchmark(ShapeBenchmark):
+    shape = staticmethod(large_string)
+    sizes = [1, 100, 1000]
+
+
+class ObjectGraphBenchmark(ShapeBenchmark):
+    shape = staticmethod(object_graph)
+    sizes = [10, 1000, 10000]
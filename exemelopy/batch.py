@@ -0,0 +1,72 @@
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool, cpu_count
+from multiprocessing.pool import ThreadPool
+
+from exemelopy.encoder import EncoderConfig
+
+
+__all__ = (
+    'encode_many',
+    )
+
+
+def encode_many(payloads, workers=None, threads=False, chunksize=64,
+                max_pending=None, pool=None, config=None, **options):
+    """Encodes each of ``payloads`` as a separate document on a
+    pool of workers, yielding the encoded strings in the same order
+    as the ``payloads``.
+
+    ``workers`` processes are started, one per CPU by default, or
+    threads when ``threads`` is ``True``; an existing
+    ``multiprocessing`` pool can be given as ``pool`` instead, and
+    is left running afterwards. Payloads are sent to the workers
+    ``chunksize`` at a time, and no more than ``max_pending`` chunks
+    (twice the number of workers by default) are in flight at once,
+    so ``payloads`` may be a generator of any length. When using
+    processes, payloads and results must be picklable.
+
+    Documents are encoded using ``config``, an ``EncoderConfig``,
+    or one created from any other keyword arguments.
+    """
+    if config is None:
+        config = EncoderConfig(**options)
+
+    own_pool = pool is None
+    if own_pool:
+        workers = workers or cpu_count()
+        pool = (threads and ThreadPool or Pool)(workers)
+
+    if max_pending is None:
+        max_pending = 2 * (workers or cpu_count())
+
+    payloads = iter(payloads)
+    pending = deque()
+
+    try:
+        while True:
+            chunk = list(islice(payloads, chunksize))
+            if not chunk:
+                break
+
+            pending.append(pool.apply_async(_encode_chunk, (config, chunk)))
+
+            if len(pending) >= max_pending:
+                for output in pending.popleft().get():
+                    yield output
+
+        while pending:
+            for output in pending.popleft().get():
+                yield output
+
+    finally:
+        if own_pool:
+            if pending:
+                pool.terminate()
+            else:
+                pool.close()
+            pool.join()
+
+
+def _encode_chunk(config, payloads):
+    return [config.dumps(data) for data in payloads]
@@ -0,0 +1,173 @@
+import threading
+
+try:
+    from collections import OrderedDict  # python 2.7+
+except ImportError:
+    from ordereddict import OrderedDict
+
+
+__all__ = (
+    'LRUCache',
+    'OutputCache',
+    )
+
+
+class LRUCache(object):
+    """A bounded mapping which evicts the entries that have gone
+    unused the longest once ``maxsize`` is reached.
+
+    Entries are kept in two generations: lookups are served from
+    the current generation, or moved up to it from the previous
+    one. When the current generation is full it becomes the
+    previous one, dropping every entry which wasn't used since the
+    last turnover. This keeps a hit down to a single dictionary
+    lookup, without the bookkeeping an exact ordering needs on
+    every access.
+
+    The number of ``hits`` and ``misses`` are counted for tuning
+    ``maxsize``. The cache may be shared between threads, although
+    the counters are then approximate.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._current = {}
+        self._previous = {}
+
+    def get(self, key, default=None):
+        try:
+            value = self._current[key]
+        except KeyError:
+            try:
+                value = self._previous[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self[key] = value
+
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key, value):
+        current = self._current
+        if len(current) >= max(self.maxsize // 2, 1):
+            self._previous = current
+            self._current = current = {}
+
+        current[key] = value
+
+    def __contains__(self, key):
+        return key in self._current or key in self._previous
+
+    def __len__(self):
+        current = self._current
+        return len(current) + sum(1 for key in self._previous
+                                  if key not in current)
+
+    def clear(self):
+        """Removes every entry and resets the counters."""
+        self.hits = 0
+        self.misses = 0
+        self._current = {}
+        self._previous = {}
+
+    def __repr__(self):
+        return '<%s hits=%d misses=%d size=%d maxsize=%d>' % (
+            self.__class__.__name__, self.hits, self.misses,
+            len(self), self.maxsize)
+
+
+class _SizedCache(object):
+    """Keeps entries until their total size, in approximate bytes,
+    goes over ``maxbytes``, then drops the least recently used.
+
+    The number of ``hits``, ``misses`` and ``evictions`` are counted
+    for tuning. The cache may be shared between threads.
+    """
+
+    def __init__(self, maxbytes):
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def hit_rate(self):
+        """The fraction of lookups which were hits."""
+        lookups = self.hits + self.misses
+        return lookups and float(self.hits) / lookups or 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Removes every entry and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def __repr__(self):
+        return '<%s hits=%d misses=%d evictions=%d size=%d maxbytes=%d>' % (
+            self.__class__.__name__, self.hits, self.misses, self.evictions,
+            self.size, self.maxbytes)
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def _put(self, key, value, output, size):
+        if size > self.maxbytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[2]
+
+            # the value is kept when it's found by identity, so that
+            # its id can't be reused
+            self._entries[key] = (value, output, size)
+            self.size += size
+
+            while self.size > self.maxbytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted[2]
+                self.evictions += 1
+
+
+class OutputCache(_SizedCache):
+    """Keeps the documents encoded by ``to_string`` or ``dumps``,
+    by the fingerprint of what was encoded, so that encoding equal
+    data again returns the same bytes without encoding anything.
+
+    It is given to an encoder as its ``output_cache``, which also
+    needs to be ``canonical``. Data holding anything which can't be
+    fingerprinted, such as an iterator, is encoded as usual; see
+    ``XMLEncoder.fingerprint``. The cache should be cleared after
+    registering handlers.
+
+    The least recently used documents are dropped once their total
+    size goes over ``maxbytes``, and the number of ``hits``,
+    ``misses`` and ``evictions`` are counted for tuning. A cache may
+    be shared between encoders with different options, and between
+    threads.
+    """
+
+    def __init__(self, maxbytes=16 * 1024 * 1024):
+        super(OutputCache, self).__init__(maxbytes)
@@ -0,0 +1,141 @@
+import bz2
+import zlib
+from contextlib import contextmanager
+
+try:
+    import lzma  # python 3.3+
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+
+def _compressor(compression, level=None):
+    """Returns a new compressor for the format named ``compression``,
+    at its default level when ``level`` is ``None``."""
+    if compression == 'gzip':
+        if level is None:
+            level = zlib.Z_DEFAULT_COMPRESSION
+        # a gzip header and trailer rather than zlib's
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    if compression == 'bz2':
+        if level is None:
+            level = 9
+        return bz2.BZ2Compressor(level)
+
+    if compression == 'lzma':
+        return _lzma().LZMACompressor(preset=level)
+
+    raise ValueError('unknown compression %r' % (compression,))
+
+
+def _decompressor(compression):
+    """Returns a new decompressor for the format named
+    ``compression``."""
+    if compression == 'gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    if compression == 'bz2':
+        return bz2.BZ2Decompressor()
+
+    if compression == 'lzma':
+        return _lzma().LZMADecompressor()
+
+    raise ValueError('unknown compression %r' % (compression,))
+
+
+def _lzma():
+    if lzma is None:
+        raise ValueError("'lzma' compression needs the lzma module, "
+                         "or backports.lzma before python 3.3")
+
+    return lzma
+
+
+class _CompressedFile(object):
+    """Compresses everything written to it with ``compressor`` before
+    writing it to the file-like object ``fp``.
+
+    ``close`` writes the end of the compressed data, but leaves
+    ``fp`` open.
+    """
+
+    def __init__(self, fp, compressor):
+        self.fp = fp
+        self.compressor = compressor
+
+    def write(self, data):
+        data = self.compressor.compress(data)
+        if data:
+            self.fp.write(data)
+
+    def close(self):
+        self.fp.write(self.compressor.flush())
+
+
+def _compress_chunks(chunks, compressor):
+    """Yields the compressed ``chunks``, skipping any which don't
+    complete a block of compressed output."""
+    for chunk in chunks:
+        chunk = compressor.compress(chunk)
+        if chunk:
+            yield chunk
+
+    yield compressor.flush()
+
+
+class _DecompressedFile(object):
+    """Reads the file-like object ``fp`` through ``decompressor``,
+    a block at a time."""
+
+    def __init__(self, fp, decompressor):
+        self.fp = fp
+        self.decompressor = decompressor
+        self.buffer = ''
+        # the position in ``buffer`` of the next byte to be read
+        self.offset = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return ''.join(iter(lambda: self.read(_BLOCK), ''))
+
+        while self.offset >= len(self.buffer):
+            if self.decompressor is None:
+                return ''
+
+            block = self.fp.read(_BLOCK)
+            if block:
+                self.buffer = self.decompressor.decompress(block)
+            else:
+                # anything still held by the decompressor
+                flush = getattr(self.decompressor, 'flush', None)
+                self.buffer = flush and flush() or ''
+                self.decompressor = None
+            self.offset = 0
+
+        data = self.buffer[self.offset:self.offset + size]
+        self.offset += len(data)
+        return data
+
+
+@contextmanager
+def _decompressed(source, compression):
+    """Opens ``source``, a filename or a file-like object, to be read
+    through a decompressor for ``compression``, or passes it on as it
+    is when that's ``None``."""
+    if compression is None:
+        yield source
+        return
+
+    decompressor = _decompressor(compression)
+    if isinstance(source, basestring):
+        with open(source, 'rb') as f:
+            yield _DecompressedFile(f, decompressor)
+    else:
+        yield _DecompressedFile(source, decompressor)
+
+
+# the number of compressed bytes read at a time
+_BLOCK = 65536
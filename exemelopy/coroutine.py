@@ -0,0 +1,110 @@
+from types import InstanceType
+
+from exemelopy.encoder import EncoderConfig, _TextTarget, _is_empty
+
+
+__all__ = (
+    'async_dump',
+    )
+
+
+def async_dump(data, writer, step=1000, config=None, **options):
+    """Encodes ``data`` to XML as a generator-based coroutine, for
+    event loops such as Tornado's ``gen.coroutine``, trollius or
+    Twisted's ``inlineCallbacks``, writing the output to ``writer``
+    without blocking the loop for the whole document. It is a plain
+    generator, which has to be wrapped by the loop's decorator to be
+    waited on, as in ``yield gen.coroutine(async_dump)(data, write)``.
+
+    Control is given back to the loop after every ``step`` elements,
+    by yielding ``None``, once the output encoded so far has been
+    written. ``writer`` may be a stream with ``write`` and, like an
+    ``asyncio.StreamWriter``, a ``drain`` method whose result is
+    yielded to wait for the stream to catch up; or a function taking
+    each chunk, whose result is yielded if it isn't ``None``.
+
+    Futures anywhere in ``data``, that is values with an
+    ``add_done_callback`` method or Twisted ``Deferred`` objects, are
+    yielded in turn and replaced by the result sent back by the
+    loop, before being encoded as usual. Generators are encoded as
+    data, and never waited for.
+
+    Documents are encoded using ``config``, an ``EncoderConfig``,
+    or one created from any other keyword arguments. The output is
+    the same as ``EncoderConfig.dumps`` would return.
+    """
+    if config is None:
+        config = EncoderConfig(**options)
+
+    encoder = config._encoder
+    output = []
+    target = _TextTarget(output.append, encoder.document, encoder.encoding,
+                         config.indent and not encoder.compact,
+                         config.declaration)
+
+    while _is_awaitable(data):
+        data = yield data
+
+    if not _is_empty(data):
+        steps = encoder._encode_steps(target, data, step, _is_awaitable)
+        result = None
+
+        while True:
+            try:
+                awaiting = steps.send(result)
+            except StopIteration:
+                break
+
+            target.flush()
+            for waiting in _write(writer, output):
+                yield waiting
+
+            result = yield awaiting
+
+    target.end()
+    target.close()
+    for waiting in _write(writer, output):
+        yield waiting
+
+
+def _write(writer, output):
+    """Passes the chunks in ``output`` to ``writer``, yielding
+    anything it returns to be waited for."""
+    chunk = ''.join(output)
+    del output[:]
+
+    if not chunk:
+        return
+
+    write = getattr(writer, 'write', None)
+    if write is None:
+        waiting = writer(chunk)
+    else:
+        write(chunk)
+        drain = getattr(writer, 'drain', None)
+        waiting = drain and drain()
+
+    if waiting is not None:
+        yield waiting
+
+
+def _is_awaitable(value):
+    cls = type(value)
+    if cls is InstanceType:
+        cls = value.__class__
+
+    try:
+        return _awaitable_types[cls]
+    except KeyError:
+        awaitable = (hasattr(cls, 'add_done_callback')
+                     or hasattr(cls, 'addCallbacks'))
+        if len(_awaitable_types) < _MAX_TYPES:
+            _awaitable_types[cls] = awaitable
+        return awaitable
+
+
+# whether values of each type seen so far are futures
+_awaitable_types = {}
+
+# the most types to remember
+_MAX_TYPES = 4096
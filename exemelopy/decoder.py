@@ -0,0 +1,577 @@
+import binascii
+import re
+from array import array
+from datetime import date, datetime, time, timedelta, tzinfo
+from uuid import UUID
+
+from lxml import etree
+
+from exemelopy.compression import _decompressed, _decompressor
+from exemelopy.encoder import _RESERVED
+
+try:
+    from io import BytesIO  # python 3
+except ImportError:
+    from cStringIO import StringIO as BytesIO
+
+
+__all__ = (
+    'XMLDecoder',
+    'load',
+    'load_iter',
+    'loads',
+    )
+
+
+_is_timestamp = re.compile(
+    r'^(?:(\d{4})-(\d{2})-(\d{2}))?'
+    r'(?:T?(\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,6}))?)?'
+    r'(?:([+-])(\d{2}):(\d{2}))?$'
+)
+
+
+class XMLDecoder(object):
+    """Decodes XML produced by ``XMLEncoder`` back into native
+    Python values.
+
+    Elements are read according to their ``nodetype`` attribute:
+    'list' and 'generated-list' become a ``list``, 'unique-list' a
+    ``set``, 'fixed-list' a ``tuple``, 'boolean' a ``bool``, 'uuid'
+    a ``uuid.UUID``, 'timestamp' a ``datetime``, ``date`` or
+    ``time``, and 'binary' the bytes its base64 text encodes. An
+    'array' becomes an ``array.array`` of its ``typecode``, or a
+    ``numpy.ndarray`` of its ``dtype``; without numpy these are
+    returned as nested lists instead.
+
+    Elements with children and no ``nodetype``, as well as
+    'container' elements, become a ``dict`` keyed on the child
+    element names, or on the ``name`` attribute of ``<node>``
+    elements.
+
+    Any other element becomes its text as ``unicode``, or ``None``
+    when it is empty; the type of numbers isn't recorded by the
+    encoder so they are returned as text.
+
+    A 'reference' element becomes the same value as the element whose
+    ``id`` is its ``idref``, restoring values shared or contained in
+    themselves when encoded with ``references``. A reference from
+    inside a tuple or set to a value which contains it, or from
+    inside a child yielded by ``iterdecode`` to the document element,
+    becomes ``None``.
+
+    Documents written with the 'compact' profile are read in the same
+    way, by the single letter codes of their ``t`` attributes, with
+    the other attributes of an element as entries of its mapping.
+
+    The document is read in a single pass with
+    ``lxml.etree.iterparse``, decoding each element as it ends and
+    clearing it straight away; any keyword arguments are passed
+    directly to ``iterparse``.
+
+    Setting ``compression`` to 'gzip', 'bz2' or 'lzma' reads
+    documents compressed in that format, decompressing them a block
+    at a time as they are parsed.
+    """
+
+    def __init__(self, compression=None, **params):
+        if compression is not None:
+            _decompressor(compression)  # raises for unknown names
+
+        self.compression = compression
+        self.params = params
+
+    def decode(self, string):
+        """Decodes the XML document in ``string``."""
+        if self.compression is not None:
+            return self.decode_file(BytesIO(string))
+
+        params = self.params
+        if isinstance(string, unicode):
+            string = string.encode('utf-8')
+            params = dict(params, encoding='utf-8')
+
+        return self._decode(BytesIO(string), params)
+
+    def decode_file(self, source):
+        """Decodes the XML document read from ``source``, which
+        may be a filename or a file-like object."""
+        with _decompressed(source, self.compression) as source:
+            return self._decode(source, self.params)
+
+    def iterdecode(self, source):
+        """Decodes the XML document read from ``source``, which
+        may be a filename or a file-like object, yielding the
+        children of the document element one at a time.
+
+        The items of a list-like document element are yielded as
+        values; for any other document element ``(key, value)``
+        pairs are yielded instead. Each child is removed from the
+        document once it has been decoded, so memory use depends on
+        the size of the largest child rather than the whole document.
+        """
+        with _decompressed(source, self.compression) as source:
+            for item in self._iterdecode(source):
+                yield item
+
+    def _iterdecode(self, source):
+        values = []
+        decode = None
+        depth = 0
+        root = None
+        pairs = True
+
+        for event, element in etree.iterparse(source,
+                                              events=('start', 'end'),
+                                              **self.params):
+            if event == 'start':
+                if root is None:
+                    root = element
+                    pairs = (element.get('nodetype') not in _list_nodetypes
+                             and element.get('t') not in _compact_lists)
+                    decode = _element_decoder(element)
+
+                    if decode is _decode_compact_element:
+                        for pair in _compact_fields(element.attrib):
+                            yield pair
+
+                depth += 1
+                continue
+
+            depth -= 1
+            if depth == 0:
+                if root.get('t') in _compact_packed:
+                    for value in _decode_compact_element(root, ())[1]:
+                        yield value
+                break
+
+            count = len(element)
+            if count:
+                children = values[-count:]
+                del values[-count:]
+            else:
+                children = ()
+
+            pair = decode(element, children)
+            element.clear()
+
+            if depth == 1:
+                del root[0]
+                if pairs:
+                    yield _to_unicode(pair[0]), pair[1]
+                else:
+                    yield pair[1]
+
+            else:
+                values.append(pair)
+
+    def _decode(self, source, params):
+        # (key, value) pairs of the elements decoded so far whose
+        # parent is still open; an element's children are the last
+        # len(element) pairs when it ends
+        values = []
+        decode = None
+
+        for event, element in etree.iterparse(source, **params):
+            if decode is None:
+                decode = _element_decoder(element)
+
+            count = len(element)
+            if count:
+                children = values[-count:]
+                del values[-count:]
+            else:
+                children = ()
+
+            values.append(decode(element, children))
+            element.clear()
+
+        return values[0][1]
+
+
+def _element_decoder(element):
+    """Returns the function decoding the elements of the document
+    ``element`` is in; only documents encoded with ``references``
+    have an ``id`` on their document element, and need to keep
+    track of them."""
+    root = element.getroottree().getroot()
+    compact = root.get('profile') == 'compact'
+
+    if root.get('id') is None:
+        return compact and _decode_compact_element or _decode_element
+
+    return _References(compact).decode_element
+
+
+def _decode_element(element, children):
+    """Returns the ``(key, value)`` pair for ``element``,
+    given the pairs decoded from its ``children``."""
+    tag = element.tag
+    attrib = element.attrib
+
+    if attrib:
+        nodetype = attrib.get('nodetype')
+        if tag == 'node':
+            tag = attrib.get('name', tag)
+
+        if nodetype == 'array':
+            return tag, _decode_array(element.text, attrib)
+
+        convert = _nodetypes.get(nodetype, _decode_text)
+
+    else:
+        convert = _decode_text
+
+    return tag, convert(children, element.text)
+
+
+def _decode_compact_element(element, children):
+    """The same as ``_decode_element``, for documents written with
+    the 'compact' profile."""
+    tag = element.tag
+    attrib = element.attrib
+
+    if not attrib:
+        return tag, _decode_text(children, element.text)
+
+    code = attrib.get('t')
+    if tag == 'node':
+        tag = attrib.get('n', tag)
+
+    if code == 'a':
+        return tag, _decode_array(element.text, attrib)
+
+    packed = _compact_packed.get(code)
+    if packed is not None:
+        return tag, packed(map(_to_unicode, (element.text or '').split()))
+
+    value = _compact_codes.get(code, _decode_text)(children, element.text)
+
+    # strings and numbers of a mapping are written as its attributes
+    fields = _compact_fields(attrib)
+    if fields:
+        fields = dict(fields)
+        if value is not None:
+            fields.update(value)
+        value = fields
+
+    return tag, value
+
+
+def _compact_fields(attrib):
+    """Returns the ``(key, value)`` pairs written as the attributes
+    ``attrib`` of a mapping in the 'compact' profile."""
+    return [(_to_unicode(name), _to_unicode(value))
+            for name, value in attrib.iteritems()
+            if name not in _RESERVED]
+
+
+class _References(object):
+    """The values of the elements with an ``id`` decoded so far.
+
+    As elements are decoded when they end, a reference to an element
+    which is still open is decoded as an ``_Open`` placeholder. The
+    value containing it then holds ``None`` in its place until the
+    element is decoded.
+    """
+
+    def __init__(self, compact=False):
+        if compact:
+            self.decode = _decode_compact_element
+            self.attributes = 't', 'r', 'n'
+        else:
+            self.decode = _decode_element
+            self.attributes = 'nodetype', 'reference', 'name'
+
+        self.values = {}
+        self.waiting = {}
+        # the number of placeholders not yet replaced
+        self.open = 0
+
+    def decode_element(self, element, children):
+        """The same as ``_decode_element``, also restoring references
+        to the elements with an ``id``."""
+        attrib = element.attrib
+        nodetype, reference, name = self.attributes
+
+        if attrib.get(nodetype) == reference:
+            tag = element.tag
+            if tag == 'node':
+                tag = attrib.get(name, tag)
+            return tag, self.find(attrib.get('idref'))
+
+        tag, value = self.decode(element, children)
+        if self.open:
+            value = self.fill(value, children)
+
+        ident = attrib.get('id')
+        if ident is not None:
+            self.add(ident, value)
+
+        return tag, value
+
+    def find(self, ident):
+        try:
+            return self.values[ident]
+        except KeyError:
+            self.open += 1
+            return _Open(ident)
+
+    def add(self, ident, value):
+        self.values[ident] = value
+        for container, key in self.waiting.pop(ident, ()):
+            container[key] = value
+
+    def fill(self, value, children):
+        """Replaces the placeholders in ``value``, decoded from
+        ``children``, returning the value."""
+        kind = type(value)
+        fixed = kind is not dict and kind is not list
+        replaced = False
+
+        for index, (key, child) in enumerate(children):
+            if type(child) is not _Open:
+                continue
+
+            self.open -= 1
+            if fixed:
+                replaced = True
+                continue
+
+            if kind is dict:
+                key = _to_unicode(key)
+            else:
+                key = index
+
+            value[key] = None
+            self.waiting.setdefault(child.ident, []).append((value, key))
+
+        if replaced:
+            # tuples and sets can't be filled in afterwards
+            return kind(None if type(item) is _Open else item
+                        for item in value)
+
+        return value
+
+
+class _Open(object):
+    """Stands in for the value of the open element ``ident``."""
+
+    __slots__ = ('ident',)
+
+    def __init__(self, ident):
+        self.ident = ident
+
+
+def _to_unicode(text):
+    if text is None or isinstance(text, unicode):
+        return text
+
+    return unicode(text, 'utf-8')
+
+
+def _decode_text(children, text):
+    if children:
+        return _decode_mapping(children, text)
+
+    return _to_unicode(text)
+
+
+def _decode_mapping(children, text):
+    return dict((_to_unicode(key), value) for key, value in children)
+
+
+def _decode_list(children, text):
+    return [value for key, value in children]
+
+
+def _decode_set(children, text):
+    return set(_hashable(value) for key, value in children)
+
+
+def _decode_tuple(children, text):
+    return tuple(_hashable(value) for key, value in children)
+
+
+def _hashable(value):
+    """Returns ``value`` as a ``frozenset`` if it's a ``set``, which
+    can't be a member of a set, or of a tuple which is one."""
+    if type(value) is set:
+        return frozenset(value)
+
+    return value
+
+
+def _decode_boolean(children, text):
+    return text == 'true'
+
+
+def _decode_uuid(children, text):
+    return UUID(text)
+
+
+def _decode_binary(children, text):
+    return binascii.a2b_base64(text or '')
+
+
+def _decode_timestamp(children, text):
+    match = _is_timestamp.match(text or '')
+    if match is None:
+        return _to_unicode(text)
+
+    (year, month, day, hour, minute, second, fraction,
+     sign, offset_hours, offset_minutes) = match.groups()
+
+    if year is None and hour is None:
+        return _to_unicode(text)
+
+    tz = None
+    if sign:
+        offset = int(offset_hours) * 60 + int(offset_minutes)
+        tz = _FixedOffset(sign == '-' and -offset or offset)
+
+    if hour is None:
+        return date(int(year), int(month), int(day))
+
+    microsecond = int((fraction or '0').ljust(6, '0'))
+    clock = (int(hour), int(minute), int(second), microsecond, tz)
+
+    if year is None:
+        return time(*clock)
+
+    return datetime(int(year), int(month), int(day), *clock)
+
+
+def _decode_array(text, attrib):
+    text = text or ''
+    typecode = attrib.get('typecode')
+
+    if typecode is not None:
+        if typecode == 'c':
+            return array(typecode, text.encode('latin1'))
+
+        if typecode == 'u':
+            return array(typecode, _to_unicode(text))
+
+        convert = typecode in 'fd' and float or int
+        return array(typecode, map(convert, text.split()))
+
+    dtype = attrib.get('dtype', '')
+    convert = _array_conversions.get(dtype.rstrip('0123456789'), int)
+    values = map(convert, text.split())
+    shape = attrib.get('shape')
+
+    try:
+        import numpy
+    except ImportError:
+        if shape is not None:
+            for size in reversed(map(int, shape.split()[1:])):
+                values = [values[i:i + size]
+                          for i in xrange(0, len(values), size)]
+        return values
+
+    values = numpy.array(values, dtype=dtype)
+    if shape is not None:
+        values = values.reshape(map(int, shape.split()))
+    return values
+
+
+def _decode_unsupported(children, text):
+    return _to_unicode(text)
+
+
+_list_nodetypes = frozenset((
+    'list',
+    'generated-list',
+    'unique-list',
+    'fixed-list',
+    ))
+
+# the codes of the 't' attribute of the 'compact' profile
+_compact_codes = {
+    'l': _decode_list,
+    'g': _decode_list,
+    's': _decode_set,
+    't': _decode_tuple,
+    'b': lambda children, text: text == '1',
+    'u': _decode_uuid,
+    'd': _decode_timestamp,
+    'o': _decode_mapping,
+    'x': _decode_unsupported,
+    'y': _decode_binary,
+    }
+
+# lists, sets and tuples of numbers, packed into their text
+_compact_packed = {
+    'L': list,
+    'S': set,
+    'T': tuple,
+    }
+
+_compact_lists = frozenset(('l', 'g', 's', 't', 'L', 'S', 'T'))
+
+# converts the items of an 'array' by the kind of its dtype
+_array_conversions = {
+    'bool': lambda text: text == 'true',
+    'float': float,
+    'complex': complex,
+    }
+
+_nodetypes = {
+    'list': _decode_list,
+    'generated-list': _decode_list,
+    'unique-list': _decode_set,
+    'fixed-list': _decode_tuple,
+    'boolean': _decode_boolean,
+    'uuid': _decode_uuid,
+    'timestamp': _decode_timestamp,
+    'binary': _decode_binary,
+    'container': _decode_mapping,
+    'unsupported-type': _decode_unsupported,
+    }
+
+
+class _FixedOffset(tzinfo):
+    """A timezone ``minutes`` east of UTC, as read from
+    a timestamp."""
+
+    def __init__(self, minutes):
+        self._offset = timedelta(minutes=minutes)
+
+    def utcoffset(self, dt):
+        return self._offset
+
+    def dst(self, dt):
+        return timedelta(0)
+
+    def tzname(self, dt):
+        return None
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self._offset)
+
+
+def loads(string, **params):
+    """Decodes the XML document in ``string`` into native Python
+    values, much like ``json.loads``.
+
+    Any keyword arguments are passed to ``XMLDecoder``.
+    """
+    return XMLDecoder(**params).decode(string)
+
+
+def load(source, **params):
+    """Decodes the XML document read from ``source``, which may be
+    a filename or a file-like object, much like ``json.load``.
+
+    Any keyword arguments are passed to ``XMLDecoder``.
+    """
+    return XMLDecoder(**params).decode_file(source)
+
+
+def load_iter(source, **params):
+    """Decodes the XML document read from ``source`` one child of
+    the document element at a time; see ``XMLDecoder.iterdecode``.
+
+    Any keyword arguments are passed to ``XMLDecoder``.
+    """
+    return XMLDecoder(**params).iterdecode(source)
@@ -0,0 +1,2009 @@
+import binascii
+import cgi
+import codecs
+import re
+import sys
+from array import array
+from inspect import getmro
+from io import BufferedIOBase, RawIOBase
+from itertools import izip
+from operator import attrgetter, itemgetter
+from types import InstanceType, NoneType
+from uuid import UUID
+
+try:
+    from collections import OrderedDict  # python 2.7+
+except ImportError:
+    from ordereddict import OrderedDict
+
+try:
+    from cStringIO import InputType, OutputType
+    from StringIO import StringIO
+except ImportError:  # python 3
+    InputType = OutputType = StringIO = None
+
+from lxml import etree
+
+from exemelopy.__version__ import __version__
+from exemelopy.cache import LRUCache
+from exemelopy.compression import (_CompressedFile, _compress_chunks,
+                                   _compressor)
+from exemelopy.fingerprint import _Fingerprint, _Unsupported, _ordered
+
+
+__all__ = (
+    'EncoderConfig',
+    'XMLEncoder',
+    'dump',
+    'dumps',
+    'register',
+    )
+
+
+# the attributes of the element wrapping the fields of an object
+_CONTAINER = {'nodetype': u'container'}
+
+# the number of handlers registered so far, with any encoder
+_registrations = 0
+
+
+class _Dispatch(dict):
+    """The handlers resolved so far, by type, along with the number
+    of ``registrations`` they were resolved after; they are resolved
+    again once any other handler has been registered."""
+
+    __slots__ = ('registrations',)
+
+    def __init__(self):
+        dict.__init__(self)
+        self.registrations = _registrations
+
+
+class XMLEncoder(object):
+    """The main constructor method which accepts the value
+    of ``data`` to be later converted to XML.
+
+    The document element ``doc_el`` can be changed from the
+    default 'document' to any valid XML element name.
+
+    The ``encoding`` defaults to 'UTF-8', but can be changed
+    to any value accepted by ``lxml.etree``.
+
+    Setting ``strict_errors`` to ``True`` will cause a ``TypeError``
+    to be raised for unsupported types.
+
+    Strings which look like UUIDs are given a ``nodetype`` of
+    'uuid', as are ``uuid.UUID`` values. Setting ``detect_uuids``
+    to ``False`` skips checking strings, leaving ``uuid.UUID``
+    values as the only source of the 'uuid' ``nodetype``.
+
+    Setting ``backend`` to 'text' makes ``to_string`` and ``dump``
+    write the escaped XML text directly, rather than building
+    ``lxml.etree`` elements and serializing them afterwards. The
+    output is identical, but ``to_xml`` always uses the default
+    'lxml' backend.
+
+    An ``EncoderStats`` can be given as ``stats`` to count and time
+    the work done while encoding, and a ``FragmentCache`` as
+    ``fragment_cache`` to reuse the output of values encoded again
+    and again.
+
+    Setting ``references`` to ``True`` encodes each mapping, list,
+    set, tuple, array, iterable and object only once per document:
+    the first time it is found its element is given an ``id``, and
+    after that an empty element with a ``nodetype`` of 'reference'
+    and that ``id`` as its ``idref`` is written instead. Shared
+    values are then only encoded once, and values which contain
+    themselves can be encoded at all. ``loads`` restores them.
+    References can't be used with a ``fragment_cache``, and a
+    ``RecordEncoder`` gains nothing from them.
+
+    Setting ``profile`` to 'compact' writes a smaller document, which
+    ``loads`` reads back to the same values as the default 'standard'
+    profile: the ``nodetype`` attribute is replaced by a single
+    letter ``t``, booleans are written as '1' or '0', strings and
+    numbers in mappings are written as attributes of the mapping's
+    element rather than elements of their own, lists, sets and
+    tuples of numbers are written as their values separated by
+    spaces, and the output is never indented. The document element
+    is marked with a ``profile`` attribute; keys which are the names
+    of attributes the profile uses (``t``, ``n``, ``id``, ``idref``,
+    ``profile``, ``typecode``, ``dtype``, ``shape``, ``nodetype`` and
+    ``name``), or which start with 'xml', such as ``xmlns``, are
+    still written as elements. A ``RecordEncoder`` gains nothing
+    from the 'compact' profile.
+
+    Setting ``canonical`` to ``True`` makes the output depend only on
+    what ``data`` holds, rather than on the order mappings, sets and
+    objects happen to list their contents in: keys, set members and
+    attributes are put in order, sorting strings and numbers and
+    anything else by what it holds. Equal data is then always
+    written as the same bytes, which ``fingerprint``
+    identifies, and which an ``OutputCache`` given as
+    ``output_cache`` keeps for ``to_string`` to return again. Records
+    aren't compiled for a canonical ``RecordEncoder``.
+
+    Any other keyword arguments are passed directly to the
+    set-up method of ``lxml.etree``.
+    """
+
+    # handlers added through ``register`` on this class alone, by
+    # type; those of base classes are found through the MRO
+    _handlers = {}
+
+    # handlers resolved so far, by type; each class keeps its own,
+    # as handlers are resolved to the methods of the class
+    _dispatch = _Dispatch()
+
+    # the elements used for mapping keys, by key; shared by every
+    # encoder unless a subclass sets its own
+    name_cache = LRUCache(maxsize=1024)
+
+    # how the fields of objects are read and the elements used for
+    # them, by class; shared in the same way
+    _plans = {}
+
+    _backends = ('lxml', 'text')
+
+    _profiles = ('standard', 'compact')
+
+    # a UUID, with or without a pair of braces; \Z rather than $,
+    # which would also match before a trailing newline
+    _is_uuid = re.compile(
+        r'^(\{%(uuid)s\}|%(uuid)s)\Z' % {
+            'uuid': r'[0-9a-f]{8}\-[0-9a-f]{4}\-[0-9a-f]{4}'
+                    r'\-[0-9a-f]{4}\-[0-9a-f]{12}'},
+        re.I
+    )
+
+    def __init__(self, data,
+                 doc_el='document', encoding='UTF-8', strict_errors=False,
+                 detect_uuids=True, backend='lxml', stats=None,
+                 fragment_cache=None, references=False, profile='standard',
+                 canonical=False, output_cache=None, **params):
+        if backend not in self._backends:
+            raise ValueError('unknown backend %r' % (backend,))
+
+        if profile not in self._profiles:
+            raise ValueError('unknown profile %r' % (profile,))
+
+        if '_dispatch' not in type(self).__dict__:
+            type(self)._dispatch = _Dispatch()
+
+        if references and fragment_cache is not None:
+            raise ValueError('references cannot be used with a '
+                             'fragment_cache')
+
+        if output_cache is not None and not canonical:
+            raise ValueError('an output_cache can only be used with '
+                             'canonical output')
+
+        self.data = data
+        self.document = etree.Element(doc_el, **params)
+        self.encoding = encoding
+        self.strict_errors = strict_errors
+        self.detect_uuids = detect_uuids
+        self.backend = backend
+        self.stats = stats
+        self.fragment_cache = fragment_cache
+        self.references = references
+        self.profile = profile
+        self.compact = profile == 'compact'
+        self.canonical = canonical
+        self.output_cache = output_cache
+
+        # whether ``_dumps`` can build and serialize the tree directly,
+        # with nothing to measure or look up
+        self._direct = (backend == 'lxml' and stats is None
+                        and output_cache is None)
+
+        if self.compact:
+            self.document.set('profile', profile)
+            self._attach_compact()
+
+        if canonical:
+            self._attach_canonical()
+
+        if references:
+            self._attach_references()
+
+        if stats is not None:
+            self._attach(stats)
+
+        if fragment_cache is not None:
+            self._attach_fragments(fragment_cache)
+
+    def to_string(self, indent=True, declaration=True):
+        """Encodes the stored ``data`` to XML and returns a
+        ``string``.
+
+        Setting ``indent`` to ``False`` will forego any pretty-printing
+        and return a condensed value.
+
+        Setting ``declaration`` to ``False`` will skip inserting the
+        XML declaration.
+
+        With an ``output_cache``, the document is taken from the cache
+        when it holds one for equal data, and the stored document
+        isn't changed.
+        """
+        if self.backend == 'text' or self.output_cache is not None:
+            return self._dumps(self.data, indent, declaration)
+
+        return self._tostring(self.to_xml(), indent, declaration)
+
+    def fingerprint(self, indent=True, declaration=True):
+        """Returns a SHA-1 hex digest identifying the document which
+        ``to_string`` returns for the stored ``data``, with the same
+        ``indent`` and ``declaration`` arguments, such as for an HTTP
+        ``ETag``; it's the key of the ``output_cache``.
+
+        The digest is worked out from the values in ``data`` and the
+        options of the encoder, without encoding anything, so it is
+        the same for equal data however it was built. Only canonical
+        output has a fingerprint. ``None`` is returned for data which
+        can't be told from what it holds without being used up, such
+        as iterators and binary streams, and once the document has
+        been replaced or built by ``to_xml``. Registered handlers are
+        called to find what would be encoded in place of their types.
+        """
+        if not self.canonical:
+            raise ValueError('only canonical output has a fingerprint')
+
+        return self._fingerprint(self.data, indent, declaration)
+
+    def dump(self, fp, indent=True, declaration=True, compression=None,
+             compresslevel=None):
+        """Encodes the stored ``data`` to XML and writes it
+        incrementally to ``fp``, which may be a file-like object
+        or a filename.
+
+        Elements are written as soon as they are encoded rather than
+        being collected into a document first, so memory use does not
+        grow with the size of the output. The bytes written are the
+        same as those returned by ``to_string`` for the same
+        ``indent`` and ``declaration`` arguments.
+
+        Setting ``compression`` to 'gzip', 'bz2' or 'lzma' compresses
+        the output as it is written, at ``compresslevel`` or the
+        default level of the format. 'lzma' needs the ``lzma``
+        module, or ``backports.lzma`` before Python 3.3.
+        """
+        self._dump(fp, self.data, indent, declaration, compression,
+                   compresslevel)
+
+    def iterencode(self, indent=True, declaration=True, chunk_size=65536,
+                   compression=None, compresslevel=None):
+        """Encodes the stored ``data`` to XML, yielding it as it is
+        encoded in chunks of at least ``chunk_size`` bytes, apart from
+        the last, such as for the body of a streaming HTTP response.
+
+        Joined together, the chunks are the same as the string
+        returned by ``to_string`` for the same ``indent`` and
+        ``declaration`` arguments, but the whole document is never
+        held at once.
+
+        With ``compression``, as for ``dump``, each chunk is
+        compressed in turn; ``chunk_size`` is then the size of the
+        chunks before compression.
+        """
+        chunks = self._iterencode(self.data, indent, declaration,
+                                  chunk_size)
+        if compression is None:
+            return chunks
+
+        return _compress_chunks(chunks,
+                                _compressor(compression, compresslevel))
+
+    def _dumps(self, data, indent, declaration):
+        if self._direct:
+            document = self.document.__copy__()
+
+            if not _is_empty(data):
+                if self._dispatch.registrations != _registrations:
+                    self._check_dispatch()
+                self._encode(_TreeTarget(document), data)
+
+            return etree.tostring(document,
+                                  encoding=self.encoding,
+                                  xml_declaration=declaration,
+                                  pretty_print=indent and not self.compact
+                                  )
+
+        cache = self.output_cache
+        if cache is not None:
+            key = self._fingerprint(data, indent, declaration)
+            if key is not None:
+                output = cache._get(key)
+                if output is None:
+                    output = self._render(data, indent, declaration)
+                    cache._put(key, None, output, len(output))
+                return output
+
+        return self._render(data, indent, declaration)
+
+    def _render(self, data, indent, declaration):
+        if self.backend == 'text':
+            return self._write_text(None, data, indent, declaration)
+
+        document = self.document.__copy__()
+
+        if not _is_empty(data):
+            self._encode_document(_TreeTarget(document), data)
+
+        return self._tostring(document, indent, declaration)
+
+    def _fingerprint(self, data, indent, declaration):
+        document = self.document
+        if not isinstance(document, etree._Element) or len(document):
+            return None
+
+        fingerprint = _Fingerprint(type(self), self.references)
+
+        # everything besides ``data`` which the output depends on
+        header = (__version__, type(self).__module__, type(self).__name__,
+                  document.tag, sorted(document.attrib.items()),
+                  sorted(document.nsmap.items()), document.text,
+                  self.encoding, self.strict_errors, self.detect_uuids,
+                  self.references, self.profile,
+                  bool(indent and not self.compact), bool(declaration))
+        fingerprint._write('V', repr(header))
+
+        try:
+            fingerprint.add(data)
+        except _Unsupported:
+            return None
+
+        return fingerprint.hexdigest()
+
+    def _tostring(self, document, indent, declaration):
+        indent = indent and not self.compact
+
+        if self.stats is not None:
+            started = self.stats.clock()
+
+        output = etree.tostring(document,
+                                encoding=self.encoding,
+                                xml_declaration=declaration,
+                                pretty_print=indent
+                                )
+
+        if self.stats is not None:
+            self.stats.serialize_time += self.stats.clock() - started
+
+        return output
+
+    def _dump(self, fp, data, indent, declaration, compression=None,
+              compresslevel=None):
+        if compression is not None:
+            # before the file is opened, as the name may be unknown
+            compressor = _compressor(compression, compresslevel)
+
+        if isinstance(fp, basestring):
+            with open(fp, 'wb') as f:
+                return self._dump(f, data, indent, declaration,
+                                  compression, compresslevel)
+
+        if compression is not None:
+            output = _CompressedFile(fp, compressor)
+            self._dump(output, data, indent, declaration)
+            output.close()
+            return
+
+        # whatever the backend, the text is written directly, since
+        # ``lxml.etree.xmlfile`` would be several times slower, and
+        # writes non-ASCII attribute values of open elements as
+        # character references, unlike ``etree.tostring``
+        self._write_text(fp.write, data, indent, declaration)
+
+    def _iterencode(self, data, indent, declaration, chunk_size):
+        # as for ``_dump``, the text is written directly
+        output = _Chunks()
+        target = _TextTarget(output.write, self.document, self.encoding,
+                             indent and not self.compact, declaration)
+
+        if not _is_empty(data):
+            for _ in self._encode_steps(target, data, _STEP):
+                target.flush()
+                if output.size >= chunk_size:
+                    yield output.take()
+
+        target.end()
+        target.close()
+
+        if output.size:
+            yield output.take()
+
+    def _write_text(self, write, data, indent, declaration):
+        target = _TextTarget(write, self.document, self.encoding,
+                             indent and not self.compact, declaration)
+
+        if not _is_empty(data):
+            self._encode_document(target, data)
+
+        target.end()
+
+        if self.stats is None:
+            return target.close()
+
+        started = self.stats.clock()
+        output = target.close()
+        self.stats.serialize_time += self.stats.clock() - started
+        return output
+
+    def to_xml(self):
+        """Encodes the stored ``data`` to XML and returns
+        an ``lxml.etree`` value.
+        """
+        if not _is_empty(self.data):
+            self.document = self._update_document(self.document, self.data)
+
+        return self.document
+
+    def from_string(self, string):
+        """Parses a ``string`` value which
+        replaces the internal ``data`` value."""
+        self.from_buffer(string)
+
+    def from_buffer(self, buffer, huge_tree=False, **params):
+        """Parses the XML document in ``buffer``, which replaces the
+        internal document, as for ``from_string``.
+
+        A ``str`` or ``unicode`` value is parsed where it is. Any
+        other object with the buffer interface, such as a
+        ``bytearray``, a ``memoryview``, an ``mmap`` or an
+        ``array.array``, is given to the parser a block at a time
+        rather than being copied into a string first.
+
+        ``huge_tree`` lifts the limits libxml2 puts on the depth of
+        the document and the size of text, for very large inputs;
+        any other keyword arguments are passed to
+        ``lxml.etree.XMLParser``.
+        """
+        parser = etree.XMLParser(huge_tree=huge_tree, **params)
+
+        if isinstance(buffer, basestring):
+            root = etree.fromstring(buffer, parser)
+        else:
+            for block in _blocks(buffer):
+                parser.feed(block)
+            root = parser.close()
+
+        self.document = root.getroottree()
+
+    def from_file(self, source, huge_tree=False, **params):
+        """Parses the XML document read from ``source``, which
+        replaces the internal document, as for ``from_string``.
+
+        ``source`` may be a filename or URL, which libxml2 reads
+        itself, or a file-like object, including an ``mmap``. The
+        keyword arguments are those of ``from_buffer``.
+        """
+        parser = etree.XMLParser(huge_tree=huge_tree, **params)
+        self.document = etree.parse(source, parser)
+
+    def _update_document(self, node, data):
+        self._encode_document(_TreeTarget(node), data)
+        return node
+
+    def _attach(self, stats):
+        """Measures the work of this encoder into ``stats``.
+
+        The handlers, the cache of them, and the other parts which
+        are measured are replaced on this encoder alone with ones
+        which count and time their work, so that nothing is checked
+        while encoding when there are no stats.
+        """
+        resolve = self._resolve
+
+        def resolve_measured(datatype):
+            handler = resolve(datatype)
+            if datatype is _Children or datatype is _Records:
+                # measured as part of the values they come from
+                return handler
+            return stats._measure_handler(handler)
+
+        self._dispatch = _Dispatch()
+        self._resolve = resolve_measured
+        self._element_name = stats._measure_element_name(self._element_name)
+        self.name_cache = stats._measure_name_cache(self.name_cache)
+        self._is_uuid = stats._measure_pattern(self._is_uuid, 'uuid_sniff')
+
+    def _attach_compact(self):
+        """Writes the 'compact' profile.
+
+        The handlers which write a ``nodetype`` are given the
+        attribute and the value to write instead, and mappings,
+        lists, sets and tuples are encoded by the handlers in
+        ``_COMPACT``; as with stats, only on this encoder.
+        """
+        resolve = self._resolve
+
+        def resolve_compact(datatype):
+            handler = resolve(datatype)
+            name = getattr(handler, '__name__', None)
+            if name not in _COMPACT:
+                return handler
+
+            method, arguments = _COMPACT[name]
+            if method is not None:
+                handler = getattr(type(self), method)
+            if not arguments:
+                return handler
+
+            def compact(encoder, target, data):
+                return handler(encoder, target, data, *arguments)
+
+            compact.__name__ = name
+            return compact
+
+        self._dispatch = _Dispatch()
+        self._resolve = resolve_compact
+
+    def _attach_canonical(self):
+        """Writes canonical output, with the contents of mappings and
+        sets put in order before their handlers see them; as with
+        stats, only on this encoder."""
+        resolve = self._resolve
+        cls = type(self)
+
+        def resolve_canonical(datatype):
+            handler = resolve(datatype)
+            name = getattr(handler, '__name__', None)
+
+            if name in _MAPPINGS:
+                def canonical(encoder, target, data):
+                    return handler(encoder, target, _SortedItems(_ordered(
+                        data.iteritems(), cls, itemgetter(0))))
+
+            elif name == '_encode_set':
+                def canonical(encoder, target, data):
+                    return handler(encoder, target, _ordered(data, cls))
+
+            else:
+                return handler
+
+            canonical.__name__ = name
+            return canonical
+
+        self._dispatch = _Dispatch()
+        self._resolve = resolve_canonical
+
+    def _attach_references(self):
+        """Writes a reference to the first element of any value which
+        can be shared, rather than encoding it again.
+
+        The handlers of such values are replaced on this encoder
+        alone. The values found so far are kept on the target, as it
+        only lives for one document.
+        """
+        resolve = self._resolve
+
+        def resolve_referenced(datatype):
+            handler = resolve(datatype)
+            if getattr(handler, '__name__', None) not in _SHAREABLE:
+                return handler
+
+            def referenced(encoder, target, data):
+                try:
+                    found = target.references
+                except AttributeError:
+                    found = target.references = {}
+
+                # the value is kept so that its id can't be reused
+                # by another value during the document
+                seen = found.get(id(data))
+                if seen is not None:
+                    if encoder.compact:
+                        target.set('t', u'r')
+                    else:
+                        target.set('nodetype', u'reference')
+                    target.set('idref', seen[0])
+                    return None
+
+                ident = unicode(len(found) + 1)
+                found[id(data)] = ident, data
+                target.set('id', ident)
+                return handler(encoder, target, data)
+
+            referenced.__name__ = handler.__name__
+            return referenced
+
+        self._dispatch = _Dispatch()
+        self._resolve = resolve_referenced
+
+    def _attach_fragments(self, cache):
+        """Takes the output of the values ``cache`` holds from it.
+
+        As with stats, the handlers of the cached types are replaced
+        on this encoder alone.
+        """
+        resolve = self._resolve
+
+        def resolve_cached(datatype):
+            handler = resolve(datatype)
+            if isinstance(datatype, type) and issubclass(datatype,
+                                                         cache.types):
+                return cache._wrap(handler)
+            return handler
+
+        self._dispatch = _Dispatch()
+        self._resolve = resolve_cached
+
+    def _encode_document(self, target, data):
+        """Encodes ``data`` into the document element open on
+        ``target``, counting the document into ``stats``."""
+        self._check_dispatch()
+
+        stats = self.stats
+        if stats is None:
+            return self._encode(target, data)
+
+        started = stats.clock()
+        self._encode(stats._measure_target(target), data)
+        stats.encode_time += stats.clock() - started
+        stats.documents += 1
+
+    def _check_dispatch(self):
+        """Empties the handlers resolved so far, on this encoder or
+        its class, if any have been registered since; this is checked
+        once per document rather than for every value."""
+        dispatch = self._dispatch
+        registrations = _registrations
+        if dispatch.registrations != registrations:
+            dispatch.clear()
+            dispatch.registrations = registrations
+
+    def _encode(self, target, data):
+        """Encodes ``data`` into the element currently open on
+        ``target``.
+
+        Rather than recursing for each level of nesting, the
+        children of every open element are kept on a stack of
+        iterators, so the depth of ``data`` is not limited by the
+        interpreter's recursion limit.
+        """
+        children = self._encode_value(target, data)
+        if children is None:
+            return
+
+        if type(target) is _TextTarget:
+            return self._encode_text(target, children)
+
+        dispatch = self._dispatch
+        start = target.start
+        end = target.end
+        stack = [children]
+
+        while stack:
+            for tag, attrib, value in stack[-1]:
+                start(tag, attrib)
+
+                cls = type(value)
+                if cls is InstanceType:
+                    cls = value.__class__
+
+                try:
+                    handler = dispatch[cls]
+                except KeyError:
+                    handler = dispatch[cls] = self._resolve(cls)
+
+                children = handler(self, target, value)
+                if children is not None:
+                    stack.append(children)
+                    break
+
+                end()
+
+            else:
+                stack.pop()
+                if stack:
+                    end()
+
+    def _encode_steps(self, target, data, step, awaitable=None):
+        """The same as ``_encode``, as a generator which yields
+        ``None`` after every ``step`` elements, so that the caller can
+        do something with the output so far.
+
+        Values for which ``awaitable`` returns ``True`` are yielded
+        before being encoded, and replaced by the value sent back.
+        """
+        self._check_dispatch()
+
+        if self.stats is None:
+            return self._steps(target, data, step, awaitable)
+
+        stats = self.stats
+        return stats._measure_steps(self._steps(
+            stats._measure_target(target), data, step, awaitable))
+
+    def _steps(self, target, data, step, awaitable):
+        children = self._encode_value(target, data)
+        if children is None:
+            return
+
+        dispatch = self._dispatch
+        start = target.start
+        end = target.end
+        stack = [children]
+        count = 0
+
+        while stack:
+            for tag, attrib, value in stack[-1]:
+                count += 1
+                if count >= step:
+                    count = 0
+                    yield None
+
+                if awaitable is not None:
+                    while awaitable(value):
+                        value = yield value
+
+                start(tag, attrib)
+
+                cls = type(value)
+                if cls is InstanceType:
+                    cls = value.__class__
+
+                try:
+                    handler = dispatch[cls]
+                except KeyError:
+                    handler = dispatch[cls] = self._resolve(cls)
+
+                children = handler(self, target, value)
+                if children is not None:
+                    stack.append(children)
+                    break
+
+                end()
+
+            else:
+                stack.pop()
+                if stack:
+                    end()
+
+    def _encode_text(self, target, children):
+        """The same as ``_encode`` for a ``_TextTarget``, with the
+        steps of starting an element and ending a childless one
+        written out in the loop, since this is where the text backend
+        spends most of its time."""
+        dispatch = self._dispatch
+        elements = target.stack
+        chunks = target.chunks
+        append = chunks.append
+        names = target.names
+        indent = target.indent
+        stack = [children]
+
+        while stack:
+            for tag, attrib, value in stack[-1]:
+                try:
+                    head, tail = names[tag]
+                except KeyError:
+                    head, tail = target.name(tag)
+
+                parent = elements[-1]
+                if not parent[3]:
+                    parent[3] = True
+                    if parent[1]:
+                        append(parent[0] + _format_attributes(parent[1])
+                               + u'>')
+                    else:
+                        append(parent[0] + u'>')
+
+                if indent:
+                    depth = len(elements)
+                    append(_INDENTS[depth if depth < _MAX_INDENT
+                                    else _MAX_INDENT])
+
+                element = [head, attrib and attrib.items(), None, False,
+                           tail]
+                elements.append(element)
+
+                cls = type(value)
+                if cls is InstanceType:
+                    cls = value.__class__
+
+                try:
+                    handler = dispatch[cls]
+                except KeyError:
+                    handler = dispatch[cls] = self._resolve(cls)
+
+                children = handler(self, target, value)
+                if children is not None:
+                    stack.append(children)
+                    break
+
+                if element[3]:
+                    # a handler which encoded children itself
+                    target.end()
+                    continue
+
+                elements.pop()
+                if element[1]:
+                    head += _format_attributes(element[1])
+
+                text = element[2]
+                if text is None:
+                    append(head + u'/>')
+                else:
+                    if _text_special(text) is not None:
+                        text = _escape_text(text)
+                    append(head + u'>' + text + tail)
+
+                if len(chunks) >= _CHUNKS:
+                    target.flush()
+
+            else:
+                stack.pop()
+                if stack:
+                    target.end()
+
+    def _encode_value(self, target, data):
+        """Sets the text and attributes for ``data`` on the
+        element currently open on ``target``, returning an
+        iterator of ``(tag, attrib, value)`` for its children,
+        or ``None`` if it has none."""
+        cls = type(data)
+        if cls is InstanceType:
+            cls = data.__class__
+
+        try:
+            handler = self._dispatch[cls]
+        except KeyError:
+            handler = self._dispatch[cls] = self._resolve(cls)
+
+        return handler(self, target, data)
+
+    @classmethod
+    def _resolve(cls, datatype):
+        """Finds the handler for values of ``datatype``, checking
+        registered handlers before the built-in type rules."""
+        registered = cls._registered_handler(datatype)
+        if registered is not None:
+            handler = registered[1]
+            return lambda self, target, data: \
+                self._encode_value(target, handler(data))
+
+        if datatype is NoneType:
+            return cls._encode_none
+
+        if datatype is _Children:
+            return cls._encode_children
+
+        if datatype is _Records:
+            return cls._encode_records
+
+        if datatype is bool:
+            return cls._encode_boolean
+
+        if issubclass(datatype, UUID):
+            return cls._encode_uuid
+
+        if hasattr(datatype, 'isoformat'):
+            return cls._encode_timestamp
+
+        if issubclass(datatype, basestring):
+            return cls._encode_string
+
+        if issubclass(datatype, (float, int, long)):
+            return cls._encode_scalar
+
+        if issubclass(datatype, _BINARY):
+            return cls._encode_binary
+
+        if issubclass(datatype, _FILES):
+            return cls._encode_file
+
+        if issubclass(datatype, array):
+            return cls._encode_array
+
+        # numpy is optional, and there can't be any of its values
+        # unless it has been imported already
+        numpy = sys.modules.get('numpy')
+        if numpy is not None:
+            if issubclass(datatype, numpy.ndarray):
+                return cls._encode_ndarray
+
+            if issubclass(datatype, numpy.generic):
+                return cls._encode_numpy_scalar
+
+        if hasattr(datatype, 'iteritems'):
+            return cls._encode_mapping
+
+        if issubclass(datatype, list):
+            return cls._encode_list
+
+        if issubclass(datatype, (set, frozenset)):
+            return cls._encode_set
+
+        if issubclass(datatype, tuple):
+            if hasattr(datatype, '_fields'):
+                return cls._encode_namedtuple
+            return cls._encode_tuple
+
+        # generators and any other iterator or iterable, which are
+        # only read as their items are encoded
+        if hasattr(datatype, '__iter__'):
+            return cls._encode_generator
+
+        if hasattr(datatype, '__slots__'):
+            return cls._encode_slots
+
+        return cls._encode_object
+
+    @classmethod
+    def register(cls, datatype, handler):
+        """Registers ``handler`` for values of ``datatype`` and its
+        subclasses, taking precedence over the built-in type rules.
+
+        ``handler`` is called with the value and should return a
+        replacement value which is encoded in its place, such as
+        a ``dict`` of the fields to be included. Subclasses of the
+        encoder use it too, even if registered after them, unless
+        they register their own handler for the same type.
+        """
+        global _registrations
+
+        if '_handlers' not in cls.__dict__:
+            cls._handlers = {}
+
+        cls._handlers[datatype] = handler
+        _registrations += 1
+
+    @classmethod
+    def _registered_handler(cls, datatype):
+        """Returns the ``(type, handler)`` registered for ``datatype``
+        or the nearest of its bases, or ``None``. Handlers registered
+        on this class come before those of its bases."""
+        registries = [encoder.__dict__['_handlers']
+                      for encoder in getmro(cls)
+                      if '_handlers' in encoder.__dict__]
+
+        for base in getmro(datatype):
+            for handlers in registries:
+                if base in handlers:
+                    return base, handlers[base]
+
+        return None
+
+    def _encode_none(self, target, data):
+        target.text(None)
+
+    def _encode_boolean(self, target, data, attribute='nodetype',
+                        nodetype=u'boolean', texts=(u'false', u'true')):
+        target.set(attribute, nodetype)
+        target.text(texts[data])
+
+    def _encode_string(self, target, data, attribute='nodetype',
+                       nodetype=u'uuid'):
+        if (self.detect_uuids
+            and len(data) in (36, 38)
+            and self._is_uuid.match(data)):
+            target.set(attribute, nodetype)
+
+        if isinstance(data, str):
+            target.text(unicode(data, 'latin1'))
+        else:
+            target.text(unicode(data))
+
+    def _encode_uuid(self, target, data, attribute='nodetype',
+                     nodetype=u'uuid'):
+        target.set(attribute, nodetype)
+        target.text(unicode(data))
+
+    def _encode_timestamp(self, target, data, attribute='nodetype',
+                          nodetype=u'timestamp'):
+        try:
+            text = data.isoformat()
+        except TypeError:
+            pass
+        else:
+            target.text(text)
+            target.set(attribute, nodetype)
+
+    def _encode_scalar(self, target, data):
+        target.text(unicode(data))
+
+    def _encode_binary(self, target, data, attribute='nodetype',
+                       nodetype=u'binary'):
+        target.set(attribute, nodetype)
+        pieces = _base64_pieces(data)
+
+        stream_text = getattr(target, 'stream_text', None)
+        if stream_text is None:
+            target.text(u''.join(pieces))
+        else:
+            stream_text(pieces)
+
+    def _encode_file(self, target, data):
+        """Writes a ``file`` opened in binary mode as binary, and any
+        other as the lines read from it."""
+        if 'b' in data.mode:
+            name = '_encode_binary'
+        else:
+            name = '_encode_generator'
+
+        handler = getattr(self, name)
+        if self.compact:
+            return handler(target, data, *_COMPACT[name][1])
+        return handler(target, data)
+
+    def _encode_array(self, target, data, attribute='nodetype',
+                      nodetype=u'array'):
+        target.set(attribute, nodetype)
+        target.set('typecode', unicode(data.typecode))
+
+        if data.typecode == 'c':
+            target.text(unicode(data.tostring(), 'latin1'))
+        elif data.typecode == 'u':
+            target.text(data.tounicode())
+        else:
+            target.text(self._format_values(data, str))
+
+    def _encode_ndarray(self, target, data, attribute='nodetype',
+                        nodetype=u'array', items=u'list'):
+        if data.ndim == 0:
+            return self._encode_value(target, data.item())
+
+        kind = data.dtype.kind
+        if kind not in 'biufc':
+            # strings, objects, dates and records
+            target.set(attribute, items)
+            return self._encode_items(target, data.tolist())
+
+        target.set(attribute, nodetype)
+        target.set('dtype', unicode(data.dtype))
+        if data.ndim > 1:
+            target.set('shape', u' '.join(map(unicode, data.shape)))
+
+        if kind == 'b':
+            format = _BOOLEANS.__getitem__
+        else:
+            format = str
+
+        target.text(self._format_values(data.ravel(), format))
+
+    def _encode_numpy_scalar(self, target, data):
+        return self._encode_value(target, data.item())
+
+    def _format_values(self, values, format):
+        """Returns the items of ``values``, an ``array`` or a flat
+        ``ndarray``, as text separated by spaces.
+
+        Each slice of ``values`` is converted to Python values in one
+        go, and formatted without returning to the interpreter for
+        each item; slicing keeps the lists this needs small.
+        """
+        step = _ARRAY_SLICE
+        return ' '.join([' '.join(map(format, values[i:i + step].tolist()))
+                         for i in xrange(0, len(values), step)])
+
+    def _encode_mapping(self, target, data):
+        return self._mapping_children(target, data)
+
+    def _mapping_children(self, target, data):
+        names = self.name_cache
+
+        for name, value in data.iteritems():
+            if isinstance(name, basestring):
+                element = names.get(name, _MISSING)
+                if element is _MISSING:
+                    element = names[name] = self._element_name(name)
+            else:
+                element = self._element_name(name)
+
+            if element is _PROCESSING_INSTRUCTION:
+                self._add_processing_instruction(target, value)
+
+            elif element is not None:
+                yield element[0], element[1], value
+
+    def _encode_compact_mapping(self, target, data):
+        """Sets the strings and numbers in ``data`` as attributes of
+        the open element, returning the elements for the rest.
+
+        Every attribute has to be set before the first child is
+        started, so the children are found all at once."""
+        names = self.name_cache
+        uuids = self.detect_uuids
+        children = []
+
+        for name, value in data.iteritems():
+            if isinstance(name, basestring):
+                element = names.get(name, _MISSING)
+                if element is _MISSING:
+                    element = names[name] = self._element_name(name)
+            else:
+                element = self._element_name(name)
+
+            if element is _PROCESSING_INSTRUCTION:
+                self._add_processing_instruction(target, value)
+                continue
+
+            if element is None:
+                continue
+
+            tag, attrib = element
+            if attrib is not None:
+                # <node n="...">
+                children.append((tag, {'n': attrib['name']}, value))
+                continue
+
+            kind = type(value)
+            # names starting with 'xml' are reserved by XML itself,
+            # and 'xmlns' would declare a namespace
+            if tag not in _RESERVED and tag[:3].lower() != u'xml':
+                if kind is unicode or kind is str:
+                    # empty strings are left as elements, which are
+                    # decoded as None in either profile
+                    if value and not (uuids and len(value) in (36, 38)
+                                      and self._is_uuid.match(value)):
+                        if kind is str:
+                            value = unicode(value, 'latin1')
+                        target.set(tag, value)
+                        continue
+
+                elif kind is int or kind is float or kind is long:
+                    target.set(tag, unicode(value))
+                    continue
+
+            children.append((tag, None, value))
+
+        return iter(children)
+
+    def _encode_compact_items(self, target, data, nodetype, packed):
+        """Writes ``data`` as its items, or as the text of their
+        values separated by spaces when they're all numbers."""
+        if data and all(type(item) in _NUMBERS for item in data):
+            target.set('t', packed)
+            target.text(u' '.join(map(unicode, data)))
+            return None
+
+        target.set('t', nodetype)
+        return self._encode_items(target, data)
+
+    def _element_name(self, name):
+        """Returns the ``(tag, attrib)`` of the element for the
+        mapping key ``name``, ``_PROCESSING_INSTRUCTION``, or ``None``
+        for keys which are skipped."""
+        if isinstance(name, basestring) and name:
+            try:
+                first = str(name[0])
+            except ValueError:
+                first = None
+
+            if first is '?':
+                #  processing instruction
+                return _PROCESSING_INSTRUCTION
+
+            if first is '!':
+                # doctypes not implemented
+                return None
+
+            if first is not None and first.isalpha():
+                try:
+                    etree.QName(name)
+                except ValueError:
+                    pass
+                else:
+                    return unicode(name), None
+
+        # node name is invalid, use <node name="{name}">
+        return u'node', {'name': unicode(name)}
+
+    def _encode_list(self, target, data, attribute='nodetype',
+                     nodetype=u'list'):
+        target.set(attribute, nodetype)
+        return self._encode_items(target, data)
+
+    def _encode_set(self, target, data, attribute='nodetype',
+                    nodetype=u'unique-list'):
+        target.set(attribute, nodetype)
+        return self._encode_items(target, data)
+
+    def _encode_tuple(self, target, data, attribute='nodetype',
+                      nodetype=u'fixed-list'):
+        target.set(attribute, nodetype)
+        return self._encode_items(target, data)
+
+    def _encode_generator(self, target, data, attribute='nodetype',
+                          nodetype=u'generated-list'):
+        target.set(attribute, nodetype)
+        items = self._encode_items(target, data)
+
+        flush = getattr(target, 'flush', None)
+        if flush is None:
+            return items
+
+        return _flush_each(items, flush)
+
+    def _encode_namedtuple(self, target, data, container=_CONTAINER):
+        try:
+            tag, tags, attribs, fields = self._plans[data.__class__]
+        except KeyError:
+            tag, tags, attribs, fields = self._plan(data.__class__,
+                                                    data._fields, False)
+
+        return self._encode_container(tag, izip(tags, attribs, data),
+                                      container)
+
+    def _encode_slots(self, target, data, container=_CONTAINER):
+        try:
+            tag, tags, attribs, fields = self._plans[data.__class__]
+        except KeyError:
+            slots = data.__class__.__slots__
+            if isinstance(slots, basestring):
+                slots = (slots,)
+
+            tag, tags, attribs, fields = self._plan(
+                data.__class__, [n for n in slots if _is_public(n)], True)
+
+        return self._encode_container(tag,
+                                      izip(tags, attribs, fields(data)),
+                                      container)
+
+    def _encode_object(self, target, data, container=_CONTAINER):
+        try:
+            attrs = data.__dict__
+        except AttributeError:
+            if self.compact:
+                return self._encode_unsupported(
+                    target, data, *_COMPACT['_encode_unsupported'][1])
+            return self._encode_unsupported(target, data)
+
+        try:
+            tag, fields = self._plans[data.__class__]
+        except KeyError:
+            tag, fields = self._plans[data.__class__] = (
+                unicode(data.__class__.__name__), {})
+
+        return self._encode_container(tag,
+                                      self._object_children(fields, attrs),
+                                      container)
+
+    def _object_children(self, fields, attrs):
+        """Yields the public attributes in ``attrs``, looking up their
+        elements in ``fields``, the names seen so far for the class."""
+        items = attrs.iteritems()
+        if self.canonical:
+            items = _ordered(items, type(self), itemgetter(0))
+
+        for name, value in items:
+            try:
+                element = fields[name]
+            except KeyError:
+                element = _is_public(name) and self._field_element(name)
+                if len(fields) < _MAX_FIELDS:
+                    fields[name] = element
+
+            if element:
+                yield element[0], element[1], value
+
+    def _plan(self, cls, names, slots):
+        """Works out and keeps the plan for encoding the fields
+        ``names`` of ``cls``: the container element, the tag and
+        attributes of each field's element, and a function returning
+        their values from an instance, if they are read by name."""
+        elements = [self._field_element(name) for name in names]
+        tags = tuple(element[0] for element in elements)
+        attribs = tuple(element[1] for element in elements)
+
+        if not slots:
+            fields = None
+        elif len(names) == 1:
+            get = attrgetter(names[0])
+            fields = lambda data: (get(data),)
+        elif names:
+            fields = attrgetter(*names)
+        else:
+            fields = lambda data: ()
+
+        plan = self._plans[cls] = (unicode(cls.__name__), tags, attribs,
+                                   fields)
+        return plan
+
+    def _field_element(self, name):
+        """Returns the ``(tag, attrib)`` of the element for the
+        attribute ``name``."""
+        element = self._element_name(name)
+        if type(element) is not tuple:
+            return u'node', {'name': unicode(name)}
+        return element
+
+    def _encode_unsupported(self, target, data, attribute='nodetype',
+                            nodetype=u'unsupported-type'):
+        if self.strict_errors:
+            raise TypeError('%s is not XML serializable' % type(data))
+
+        target.set(attribute, nodetype)
+        target.text(self._to_unicode(type(data)))
+
+    def _encode_items(self, target, items):
+        return ((u'i', None, item) for item in items)
+
+    def _encode_container(self, tag, children, container):
+        return iter(((tag, container, _Children(children)),))
+
+    def _encode_children(self, target, data):
+        return data.children
+
+    def _encode_records(self, target, data):
+        children = self._encode_value(target, data.rows)
+        if children is None:
+            return
+
+        if type(target) is _TreeTarget:
+            encode_record = data.encode_tree
+        else:
+            encode_record = data.encode
+
+        for tag, attrib, row in children:
+            target.start(tag, attrib)
+            if not encode_record(self, target, row):
+                self._encode(target, row)
+            target.end()
+
+    def _is_scalar(self, value):
+        return isinstance(value, (basestring, float, int, long))
+
+    def _to_unicode(self, string):
+        if not string and not self._is_scalar(string):
+            return u''
+
+        return unicode(self.__escape(string))
+
+    def _add_processing_instruction(self, node, data):
+        raise NotImplementedError(
+            'creating processing instructions '
+            'has not been implemented'
+        )
+
+    def _add_doctype(self, item):
+        raise NotImplementedError(
+            'creating doctype declarations '
+            'has not been implemented'
+        )
+
+    def __dict_to_attrs(self, d):
+        return ('%s="%s"' % (name, value) for name, value in d.iteritems())
+
+    def __escape(self, data):
+        if data is None:
+            return None
+
+        if isinstance(data, unicode):
+            return data
+
+        if isinstance(data, str):
+            try:
+                data = unicode(data, 'latin1')
+            except Exception:
+                pass
+
+        return data
+
+    def __unicodeToHTMLEntities(self, text):
+        """Converts unicode to HTML entities.
+        For example '&' becomes '&amp;'."""
+        return cgi.escape(text).encode('ascii', 'xmlcharrefreplace')
+
+
+register = XMLEncoder.register
+
+
+class EncoderConfig(object):
+    """A reusable set of encoding options, accepting the
+    ``indent`` and ``declaration`` arguments of
+    ``XMLEncoder.to_string`` along with any keyword arguments
+    of ``XMLEncoder`` itself.
+
+    ``cls`` can be set to a subclass of ``XMLEncoder``, such as
+    one with extra handlers registered.
+
+    A config cannot be changed once created, so a single instance
+    can be shared between threads. Values of a type already seen
+    by any config using the same ``cls`` are encoded without
+    looking up their handler again.
+    """
+
+    __slots__ = ('indent', 'declaration', 'options', '_encoder')
+
+    def __init__(self, indent=True, declaration=True, cls=XMLEncoder,
+                 **options):
+        set_ = super(EncoderConfig, self).__setattr__
+        set_('indent', indent)
+        set_('declaration', declaration)
+        set_('options', options)
+        set_('_encoder', cls(None, **options))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('%s objects cannot be changed'
+                             % self.__class__.__name__)
+
+    def __reduce__(self):
+        return (_restore_config, (self.indent, self.declaration,
+                                  type(self._encoder), self.options))
+
+    def dumps(self, data):
+        """Encodes ``data`` to XML and returns a ``string``."""
+        return self._encoder._dumps(data, self.indent, self.declaration)
+
+    def fingerprint(self, data):
+        """Returns the fingerprint of the document ``dumps`` returns
+        for ``data``, as for ``XMLEncoder.fingerprint``."""
+        encoder = self._encoder
+        if not encoder.canonical:
+            raise ValueError('only canonical output has a fingerprint')
+
+        return encoder._fingerprint(data, self.indent, self.declaration)
+
+    def dump(self, data, fp, compression=None, compresslevel=None):
+        """Encodes ``data`` to XML and writes it incrementally to
+        ``fp``, which may be a file-like object or a filename,
+        compressed as for ``XMLEncoder.dump``."""
+        self._encoder._dump(fp, data, self.indent, self.declaration,
+                            compression, compresslevel)
+
+    def iterencode(self, data, chunk_size=65536, compression=None,
+                   compresslevel=None):
+        """Encodes ``data`` to XML, yielding it in chunks of at least
+        ``chunk_size`` bytes as it is encoded, compressed as for
+        ``XMLEncoder.iterencode``."""
+        chunks = self._encoder._iterencode(data, self.indent,
+                                           self.declaration, chunk_size)
+        if compression is None:
+            return chunks
+
+        return _compress_chunks(chunks,
+                                _compressor(compression, compresslevel))
+
+
+def _restore_config(indent, declaration, cls, options):
+    return EncoderConfig(indent, declaration, cls, **options)
+
+
+_default_config = EncoderConfig()
+
+
+def _get_config(cls, options):
+    if cls is XMLEncoder and not options:
+        return _default_config
+
+    return EncoderConfig(cls=cls, **options)
+
+
+def dumps(data, cls=XMLEncoder, **options):
+    """Encodes ``data`` to XML and returns a ``string``, much like
+    ``json.dumps``.
+
+    The keyword arguments are those of ``EncoderConfig``; when
+    encoding many values with the same options, create an
+    ``EncoderConfig`` once and use its ``dumps`` method instead.
+    """
+    if cls is XMLEncoder and not options:
+        return _default_config._encoder._dumps(data, True, True)
+
+    return _get_config(cls, options).dumps(data)
+
+
+def dump(data, fp, cls=XMLEncoder, compression=None, compresslevel=None,
+         **options):
+    """Encodes ``data`` to XML and writes it incrementally to
+    ``fp``, much like ``json.dump``, compressed as for
+    ``XMLEncoder.dump``.
+
+    The other keyword arguments are those of ``EncoderConfig``.
+    """
+    _get_config(cls, options).dump(data, fp, compression, compresslevel)
+
+
+# libxml2 stops indenting any further after this many levels
+_MAX_INDENT = 30
+_INDENTS = [u'\n' + u'  ' * level for level in xrange(_MAX_INDENT + 1)]
+
+# the number of items of an array formatted at a time
+_ARRAY_SLICE = 65536
+
+# the text for each value in a boolean array, by value
+_BOOLEANS = ('false', 'true')
+
+# the number of bytes of a binary value encoded at a time, which
+# has to be a multiple of three for the pieces of base64 to join up
+_BINARY_CHUNK = 3 * 16384
+
+# the number of bytes of a buffer given to the parser at a time
+_PARSE_BLOCK = 65536
+
+# the number of elements encoded between checks of the output
+# collected by ``iterencode``
+_STEP = 256
+
+# marks a missing cache entry
+_MISSING = object()
+
+# marks an element whose text has been written by ``stream_text``
+_STREAMED = object()
+
+# ``memoryview``, or ``None`` on python 2.6, which only has the old
+# buffer interface of ``buffer``
+try:
+    _memoryview = memoryview
+except NameError:
+    _memoryview = None
+
+# the types encoded as base64, apart from ``str`` before python 3
+# and ``file`` objects opened in binary mode
+try:
+    _BINARY = (bytearray, buffer, BufferedIOBase, RawIOBase, InputType,
+               OutputType, StringIO)
+except NameError:
+    _BINARY = (bytes, bytearray, BufferedIOBase, RawIOBase)
+if _memoryview is not None:
+    _BINARY += (_memoryview,)
+
+# python 2's own files, which hold bytes or lines of text depending
+# on the mode they were opened in
+try:
+    _FILES = (file,)
+except NameError:
+    _FILES = ()
+
+# the most attribute names of a class whose elements are kept
+_MAX_FIELDS = 1024
+
+# returned by ``_element_name`` for processing instruction keys
+_PROCESSING_INSTRUCTION = object()
+
+
+class _Children(object):
+    """Wraps ``(tag, attrib, value)`` entries which are encoded as
+    children of the element they are assigned to."""
+
+    __slots__ = ('children',)
+
+    def __init__(self, children):
+        self.children = children
+
+
+class _Records(object):
+    """Rows encoded by functions generated by ``RecordEncoder``,
+    ``encode_tree`` for a ``_TreeTarget`` and ``encode`` for any
+    other target, or as usual when they return ``False``."""
+
+    __slots__ = ('rows', 'encode_tree', 'encode')
+
+    def __init__(self, rows, encode_tree, encode):
+        self.rows = rows
+        self.encode_tree = encode_tree
+        self.encode = encode
+
+
+class _SortedItems(object):
+    """Stands in for a mapping given to its handler by canonical
+    encoders, with its ``items`` in order."""
+
+    __slots__ = ('items',)
+
+    def __init__(self, items):
+        self.items = items
+
+    def iteritems(self):
+        return iter(self.items)
+
+
+class _TreeTarget(object):
+    """Builds the encoded output as ``lxml.etree`` elements
+    beneath ``node``.
+
+    The open elements are kept on a stack rather than found again
+    with ``getparent``; while an ancestor is referenced from Python
+    lxml doesn't need to walk up to the root each time an element
+    is released, which would make deep documents quadratic.
+    """
+
+    def __init__(self, node):
+        self.stack = [node]
+
+    def start(self, tag, attrib=None):
+        self.stack.append(etree.SubElement(self.stack[-1], tag, attrib))
+
+    def end(self):
+        self.stack.pop()
+
+    def set(self, name, value):
+        self.stack[-1].set(name, value)
+
+    def text(self, value):
+        self.stack[-1].text = value
+
+
+class _Chunks(object):
+    """Collects the chunks written to it, and their total size."""
+
+    __slots__ = ('chunks', 'size')
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, chunk):
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+
+    def take(self):
+        """Returns the chunks written so far as one, and forgets
+        them."""
+        chunk = ''.join(self.chunks)
+        del self.chunks[:]
+        self.size = 0
+        return chunk
+
+
+def _flush_each(items, flush):
+    """Yields each of ``items``, calling ``flush`` once it has been
+    encoded, before the next one is produced; the items of a slow
+    source such as a database cursor are then written out as they
+    arrive, rather than waiting for a buffer to fill."""
+    for item in items:
+        yield item
+        flush()
+
+
+def _is_public(name):
+    """Whether the attribute ``name`` is encoded."""
+    return name[:1] != '_'
+
+
+def _base64_pieces(data):
+    """Yields the base64 encoding of the bytes of ``data`` a piece
+    at a time, each from ``_BINARY_CHUNK`` bytes of the input.
+
+    In-memory streams are encoded whole, as ``getvalue`` would
+    return them, and any other stream from where it is to its end.
+    """
+    getbuffer = getattr(data, 'getbuffer', None)
+    if getbuffer is not None:
+        # a view of the buffer, rather than a copy
+        data = getbuffer()
+
+    elif hasattr(data, 'read'):
+        rewind = hasattr(data, 'getvalue')
+        if rewind:
+            position = data.tell()
+            data.seek(0)
+
+        try:
+            while True:
+                chunk = data.read(_BINARY_CHUNK)
+                if not chunk:
+                    return
+                yield unicode(binascii.b2a_base64(chunk)[:-1])
+        finally:
+            if rewind:
+                data.seek(position)
+
+    if _memoryview is None:
+        view = buffer(data)
+    else:
+        view = _memoryview(data)
+    for start in xrange(0, len(view), _BINARY_CHUNK):
+        yield unicode(binascii.b2a_base64(
+            view[start:start + _BINARY_CHUNK])[:-1])
+
+
+def _blocks(data):
+    """Yields the bytes of ``data`` a block at a time."""
+    if _memoryview is not None:
+        try:
+            view = _memoryview(data)
+        except TypeError:
+            pass
+        else:
+            for start in xrange(0, len(view), _PARSE_BLOCK):
+                yield view[start:start + _PARSE_BLOCK].tobytes()
+            return
+
+    # python 2.6, and objects with only the old buffer interface before
+    # python 3, such as an ``mmap`` or an ``array``, whose own slices
+    # may not be strings; slices of a ``buffer`` are
+    view = buffer(data)
+    for start in xrange(0, len(view), _PARSE_BLOCK):
+        yield view[start:start + _PARSE_BLOCK]
+
+
+def _is_empty(data):
+    """Whether ``data`` is left out of the document, as any false
+    value is; numpy arrays can't be tested for truth directly."""
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and isinstance(data, numpy.ndarray):
+        if data.ndim == 0:
+            return not data.item()
+        return data.size == 0
+
+    return not data
+
+
+class _TextTarget(object):
+    """Writes the encoded output as escaped XML text, passing it to
+    ``write`` in ``encoding`` a chunk at a time, or returning it from
+    ``close`` when ``write`` is ``None``.
+
+    The text is the same as ``etree.tostring`` produces for the same
+    elements: start tags are held back until the element's first
+    child or its end, childless elements are written in their short
+    form, and the same characters are escaped, or refused.
+    """
+
+    # the start of the start tag and the end tag, by tag; shared by
+    # every target, and only holding valid names
+    names = {}
+
+    def __init__(self, write, node, encoding, indent=True,
+                 declaration=True):
+        self.write = write
+        self.encoding = encoding
+        self.indent = indent
+        self.encode = None
+
+        if declaration:
+            try:
+                self.chunks = [_DECLARATIONS[encoding]]
+            except KeyError:
+                self.chunks = [_DECLARATIONS.setdefault(
+                    encoding,
+                    u"<?xml version='1.0' encoding='%s'?>\n" % encoding)]
+        else:
+            self.chunks = []
+
+        # the document element is started with the tag, attributes
+        # and namespaces of ``node``
+        tag = node.tag
+        if tag[0] == '{' or node.nsmap:
+            # leave namespace prefixes to lxml
+            node = etree.Element(tag, node.attrib, node.nsmap)
+            head = etree.tostring(node, encoding=unicode)[:-2]
+            node.text = u'x'
+            tail = etree.tostring(node, encoding=unicode)
+            tail = tail[tail.rindex(u'</'):]
+            attrib = None
+
+        else:
+            try:
+                head, tail = self.names[tag]
+            except KeyError:
+                head, tail = self.name(tag)
+            attrib = node.attrib.items() or None
+
+        # the start tag up to its attributes, the attributes, text,
+        # whether the start tag has been written, and the end tag
+        self.stack = [[head, attrib, None, False, tail]]
+
+    @classmethod
+    def name(cls, tag):
+        """Returns the start of the start tag and the end tag for
+        ``tag``, raising ``ValueError`` if it isn't a valid name."""
+        etree.QName(tag)
+
+        if len(cls.names) >= _MAX_NAMES:
+            cls.names.clear()
+
+        tags = cls.names[tag] = u'<' + tag, u'</%s>' % tag
+        return tags
+
+    def start(self, tag, attrib=None):
+        try:
+            head, tail = self.names[tag]
+        except KeyError:
+            head, tail = self.name(tag)
+
+        stack = self.stack
+        parent = stack[-1]
+        if not parent[3]:
+            parent[3] = True
+            if parent[1]:
+                self.chunks.append(parent[0] + _format_attributes(parent[1])
+                                   + u'>')
+            else:
+                self.chunks.append(parent[0] + u'>')
+
+        if self.indent:
+            depth = len(stack)
+            self.chunks.append(
+                _INDENTS[depth if depth < _MAX_INDENT else _MAX_INDENT])
+
+        stack.append([head, attrib and attrib.items(), None, False, tail])
+
+    def end(self):
+        head, attrib, text, started, tail = self.stack.pop()
+        chunks = self.chunks
+
+        if started:
+            if self.indent and started is not _STREAMED:
+                depth = len(self.stack)
+                chunks.append(
+                    _INDENTS[depth if depth < _MAX_INDENT else _MAX_INDENT])
+            chunks.append(tail)
+
+        else:
+            if attrib:
+                head += _format_attributes(attrib)
+
+            if text is None:
+                chunks.append(head + u'/>')
+
+            else:
+                if _text_special(text) is not None:
+                    text = _escape_text(text)
+                chunks.append(head + u'>' + text + tail)
+
+            if len(chunks) >= _CHUNKS:
+                self.flush()
+
+    def set(self, name, value):
+        element = self.stack[-1]
+        if element[1] is None:
+            element[1] = [(name, value)]
+        else:
+            element[1].append((name, value))
+
+    def text(self, value):
+        self.stack[-1][2] = value
+
+    def stream_text(self, pieces):
+        """Writes each of ``pieces``, which need no escaping, as the
+        text of the open element as it arrives, which can't then
+        have any children."""
+        element = self.stack[-1]
+        head = element[0]
+        if element[1]:
+            head += _format_attributes(element[1])
+
+        chunks = self.chunks
+        chunks.append(head + u'>')
+        for piece in pieces:
+            chunks.append(piece)
+            self.flush()
+
+        element[3] = _STREAMED
+
+    def flush(self):
+        """Writes the chunks held so far."""
+        if self.write is None:
+            return
+
+        if self.encode is None:
+            self.encode = codecs.getincrementalencoder(self.encoding)(
+                'xmlcharrefreplace').encode
+
+        self.write(self.encode(u''.join(self.chunks)))
+        del self.chunks[:]
+
+    def close(self):
+        if self.indent:
+            self.chunks.append(u'\n')
+
+        if self.write is None:
+            return u''.join(self.chunks).encode(self.encoding,
+                                                'xmlcharrefreplace')
+
+        self.flush()
+
+
+# the handlers used for the 'compact' profile in place of those
+# named, or None to keep them, and the arguments they're given
+_COMPACT = {
+    '_encode_mapping': ('_encode_compact_mapping', ()),
+    '_encode_boolean': (None, ('t', u'b', (u'0', u'1'))),
+    '_encode_string': (None, ('t', u'u')),
+    '_encode_uuid': (None, ('t', u'u')),
+    '_encode_timestamp': (None, ('t', u'd')),
+    '_encode_array': (None, ('t', u'a')),
+    '_encode_ndarray': (None, ('t', u'a', u'l')),
+    '_encode_list': ('_encode_compact_items', (u'l', u'L')),
+    '_encode_set': ('_encode_compact_items', (u's', u'S')),
+    '_encode_tuple': ('_encode_compact_items', (u't', u'T')),
+    '_encode_generator': (None, ('t', u'g')),
+    '_encode_binary': (None, ('t', u'y')),
+    '_encode_unsupported': (None, ('t', u'x')),
+    '_encode_namedtuple': (None, ({'t': u'o'},)),
+    '_encode_slots': (None, ({'t': u'o'},)),
+    '_encode_object': (None, ({'t': u'o'},)),
+    }
+
+# the types of the items of lists, sets and tuples which are packed
+# into their text by the 'compact' profile
+_NUMBERS = frozenset((int, long, float))
+
+# the attributes used by either profile, which mapping keys can't
+# be written as in the 'compact' profile
+_RESERVED = frozenset((
+    't',
+    'n',
+    'id',
+    'idref',
+    'profile',
+    'typecode',
+    'dtype',
+    'shape',
+    'nodetype',
+    'name',
+    ))
+
+# the handlers of mappings, whose items are put in order for
+# canonical output
+_MAPPINGS = frozenset((
+    '_encode_compact_mapping',
+    '_encode_mapping',
+    ))
+
+# the handlers of the values which ``references`` applies to
+_SHAREABLE = frozenset((
+    '_encode_compact_mapping',
+    '_encode_namedtuple',
+    '_encode_array',
+    '_encode_ndarray',
+    '_encode_mapping',
+    '_encode_list',
+    '_encode_set',
+    '_encode_tuple',
+    '_encode_generator',
+    '_encode_slots',
+    '_encode_object',
+    ))
+
+# the number of chunks a ``_TextTarget`` holds before writing them
+_CHUNKS = 4096
+
+# the most tags ``_TextTarget`` keeps the start and end tags of
+_MAX_NAMES = 4096
+
+# XML declarations written by ``_TextTarget``, by encoding
+_DECLARATIONS = {}
+
+# characters which lxml refuses in text and attribute values
+_INVALID = u'\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff'
+if sys.maxunicode > 0xffff:
+    _INVALID += u'\ud800-\udfff'
+
+_has_invalid = re.compile(u'[%s]' % _INVALID).search
+_text_special = re.compile(u'[&<>\r%s]' % _INVALID).search
+_attribute_special = re.compile(u'[&<>"\t\n\r%s]' % _INVALID).search
+
+
+def _check_valid(value):
+    if _has_invalid(value):
+        raise ValueError('All strings must be XML compatible: '
+                         'Unicode or ASCII, no NULL bytes or '
+                         'control characters')
+
+
+def _escape_text(text):
+    _check_valid(text)
+    return (text.replace(u'&', u'&amp;')
+            .replace(u'<', u'&lt;')
+            .replace(u'>', u'&gt;')
+            .replace(u'\r', u'&#13;'))
+
+
+def _escape_attribute(value):
+    if _attribute_special(value) is None:
+        return value
+
+    _check_valid(value)
+    return (value.replace(u'&', u'&amp;')
+            .replace(u'<', u'&lt;')
+            .replace(u'>', u'&gt;')
+            .replace(u'"', u'&quot;')
+            .replace(u'\t', u'&#9;')
+            .replace(u'\n', u'&#10;')
+            .replace(u'\r', u'&#13;'))
+
+
+def _format_attributes(attrib):
+    if len(attrib) > 1 and len(dict(attrib)) < len(attrib):
+        # a repeated name keeps its first position and last value
+        attrib = OrderedDict(attrib).items()
+
+    return u''.join(u' %s="%s"' % (name, _escape_attribute(value))
+                    for name, value in attrib)
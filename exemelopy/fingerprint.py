@@ -0,0 +1,314 @@
+import hashlib
+from itertools import chain
+from operator import itemgetter
+from types import InstanceType
+
+
+class _Unsupported(Exception):
+    """Raised for a value whose output can't be told from what it
+    holds, such as an iterator, which would be used up."""
+
+
+class _Fingerprint(object):
+    """Describes values in a form which is the same for any two
+    values the encoder ``cls`` writes the same way, feeding it to a
+    SHA-1 digest.
+
+    Values are described by the handler the encoder resolves for
+    them, so that anything it would encode differently is described
+    differently; values with a handler this doesn't know are
+    ``_Unsupported``. Mappings and sets are described in an order of
+    their own, so that equal values are described the same however
+    they were built. With ``references``, a value met again is
+    described by when it was first met, as the encoder writes a
+    reference to it; otherwise a value containing itself is
+    ``_Unsupported``.
+
+    Without a ``digest``, the description is only collected, for
+    putting values in order.
+    """
+
+    def __init__(self, cls, references=False, digest=True):
+        self.cls = cls
+        self.shared = {} if references else None
+        self.open = set()
+        self.chunks = []
+        self.digest = hashlib.sha1() if digest else None
+        self.kinds = {}
+
+    def add(self, value):
+        """Describes ``value``.
+
+        As when encoding, the values within every container being
+        described are kept on a stack of iterators rather than
+        recursing for each, so the depth of ``value`` is not limited
+        by the interpreter's recursion limit.
+        """
+        kinds = self.kinds
+        chunks = self.chunks
+        stack = [iter((value,))]
+
+        while stack:
+            for value in stack[-1]:
+                kind = type(value)
+                if kind is InstanceType:
+                    kind = value.__class__
+
+                try:
+                    describe = kinds[kind]
+                except KeyError:
+                    describe = kinds[kind] = self._resolve(kind)
+
+                children = describe(self, value)
+
+                if self.digest is not None and len(chunks) >= _CHUNKS:
+                    self.flush()
+
+                if children is not None:
+                    stack.append(iter(children))
+                    break
+
+            else:
+                stack.pop()
+
+    def flush(self):
+        self.digest.update(''.join(self.chunks))
+        del self.chunks[:]
+
+    def hexdigest(self):
+        self.flush()
+        return self.digest.hexdigest()
+
+    def _resolve(self, kind):
+        registered = self.cls._registered_handler(kind)
+        if registered is not None:
+            return _registered(*registered)
+
+        name = getattr(self.cls._resolve(kind), '__name__', None)
+        return _describers.get(name, _Fingerprint._unsupported)
+
+    def _write(self, code, text):
+        """Writes ``text``, a ``str``, so that it can't run into
+        whatever follows."""
+        self.chunks.append('%s%d:' % (code, len(text)))
+        self.chunks.append(text)
+
+    def _enter(self, value, code):
+        """Starts describing the container ``value``, returning
+        ``False`` when it has been described already."""
+        if self.shared is not None:
+            entry = self.shared.get(id(value))
+            if entry is not None:
+                self.chunks.append('r%d;' % entry[0])
+                return False
+            # ``value`` is kept alive with its index, so that its id
+            # can't be taken by another value, such as one returned
+            # by a handler, while this is described
+            self.shared[id(value)] = (len(self.shared), value)
+
+        elif id(value) in self.open:
+            raise _Unsupported('%r contains itself' % type(value))
+
+        self.open.add(id(value))
+        self.chunks.append(code)
+        return True
+
+    def _contents(self, value, children):
+        """Yields ``children``, the values within the container
+        ``value``, and then ends its description."""
+        for child in children:
+            yield child
+
+        self.open.discard(id(value))
+        self.chunks.append(')')
+
+    def _none(self, value):
+        self.chunks.append('N')
+
+    def _boolean(self, value):
+        self.chunks.append(value and 'T' or 'F')
+
+    def _string(self, value):
+        if isinstance(value, str):
+            value = unicode(value, 'latin1')
+        self._write('u', unicode(value).encode('utf-8'))
+
+    def _scalar(self, value):
+        # repr tells apart floats which unicode doesn't, and the
+        # type any subclass which writes itself differently
+        self._write('n', '%s %s %s' % (_name(type(value)),
+                                       unicode(value).encode('utf-8'),
+                                       repr(value)))
+
+    def _uuid(self, value):
+        self._write('U', str(value))
+
+    def _timestamp(self, value):
+        try:
+            text = value.isoformat()
+        except TypeError:
+            text = ''
+        self._write('D', text.encode('utf-8'))
+
+    def _binary(self, value):
+        if hasattr(value, 'read'):
+            raise _Unsupported('%r is a stream' % type(value))
+        try:
+            data = memoryview(value).tobytes()
+        except NameError:
+            # python 2.6, which has only ``buffer``
+            data = str(buffer(value))
+        self._write('B', data)
+
+    def _array(self, value):
+        if self._enter(value, 'A('):
+            self._write('', value.typecode)
+            self._write('', value.tostring())
+            return self._contents(value, ())
+
+    def _ndarray(self, value):
+        if self._enter(value, 'Y('):
+            if value.ndim == 0:
+                return self._contents(value, (value.item(),))
+
+            self._write('', value.dtype.str)
+            self._write('', repr(value.shape))
+            if value.dtype.kind in 'biufc':
+                self._write('', value.tostring())
+                return self._contents(value, ())
+
+            return self._contents(value, (value.tolist(),))
+
+    def _numpy_scalar(self, value):
+        return (value.item(),)
+
+    def _mapping(self, value):
+        if self._enter(value, 'M('):
+            return self._contents(value, chain.from_iterable(
+                _ordered(value.iteritems(), self.cls, itemgetter(0))))
+
+    def _items(self, value, code):
+        if self._enter(value, code):
+            return self._contents(value, value)
+
+    def _list(self, value):
+        return self._items(value, 'L(')
+
+    def _tuple(self, value):
+        return self._items(value, 'T(')
+
+    def _set(self, value):
+        if self._enter(value, 'S('):
+            return self._contents(value, _ordered(value, self.cls))
+
+    def _namedtuple(self, value):
+        if self._enter(value, 'P('):
+            self._write('', _name(value.__class__))
+            return self._contents(value, chain.from_iterable(
+                zip(value._fields, value)))
+
+    def _slots(self, value):
+        slots = value.__class__.__slots__
+        if isinstance(slots, basestring):
+            slots = (slots,)
+
+        if self._enter(value, 'O('):
+            self._write('', _name(value.__class__))
+            children = []
+            for name in slots:
+                if name[:1] != '_':
+                    try:
+                        item = getattr(value, name)
+                    except AttributeError:
+                        raise _Unsupported('%r has no %s' % (value, name))
+                    children.extend((name, item))
+            return self._contents(value, children)
+
+    def _object(self, value):
+        try:
+            attrs = value.__dict__
+        except AttributeError:
+            self._write('X', _name(type(value)))
+            return
+
+        if self._enter(value, 'O('):
+            self._write('', _name(value.__class__))
+            return self._contents(value, chain.from_iterable(
+                (name, item) for name, item in
+                _ordered(attrs.iteritems(), self.cls, itemgetter(0))
+                if name[:1] != '_'))
+
+    def _unsupported(self, value):
+        raise _Unsupported('%r is read as it is encoded' % type(value))
+
+
+def _registered(base, handler):
+    def describe(fingerprint, value):
+        fingerprint._write('H', _name(base))
+        return (handler(value),)
+
+    return describe
+
+
+def _name(cls):
+    return '%s.%s' % (cls.__module__, cls.__name__)
+
+
+def _ordered(values, cls, key=None):
+    """Returns ``values`` in an order which depends only on what
+    they are: their natural order for strings or numbers, or else
+    the order of their descriptions for the encoder ``cls``."""
+    values = list(values)
+    keys = values if key is None else map(key, values)
+    kinds = set(map(type, keys))
+
+    if kinds <= _STRINGS and len(kinds) == 1:
+        return sorted(values, key=key)
+
+    # NaN compares false with everything, so can't be sorted
+    if kinds <= _NUMBERS and all(item == item for item in keys):
+        return sorted(values, key=key)
+
+    described = []
+    for value in values:
+        fingerprint = _Fingerprint(cls, digest=False)
+        try:
+            fingerprint.add(value if key is None else key(value))
+        except _Unsupported:
+            pass
+        described.append((''.join(fingerprint.chunks), value))
+
+    described.sort(key=itemgetter(0))
+    return [value for description, value in described]
+
+
+# the values put in their natural order, which only compares them
+# by what they are; ``str`` and ``unicode`` aren't mixed, as
+# non-ASCII strings of each can't be compared
+_NUMBERS = frozenset((bool, int, long, float))
+_STRINGS = frozenset((str, unicode))
+
+# the number of pieces of a description collected before they're
+# added to the digest
+_CHUNKS = 4096
+
+# describes the values given to each of the encoder's handlers
+_describers = {
+    '_encode_none': _Fingerprint._none,
+    '_encode_boolean': _Fingerprint._boolean,
+    '_encode_string': _Fingerprint._string,
+    '_encode_scalar': _Fingerprint._scalar,
+    '_encode_uuid': _Fingerprint._uuid,
+    '_encode_timestamp': _Fingerprint._timestamp,
+    '_encode_binary': _Fingerprint._binary,
+    '_encode_array': _Fingerprint._array,
+    '_encode_ndarray': _Fingerprint._ndarray,
+    '_encode_numpy_scalar': _Fingerprint._numpy_scalar,
+    '_encode_mapping': _Fingerprint._mapping,
+    '_encode_list': _Fingerprint._list,
+    '_encode_set': _Fingerprint._set,
+    '_encode_tuple': _Fingerprint._tuple,
+    '_encode_namedtuple': _Fingerprint._namedtuple,
+    '_encode_slots': _Fingerprint._slots,
+    '_encode_object': _Fingerprint._object,
+    }
@@ -0,0 +1,182 @@
+from copy import deepcopy
+from types import NoneType
+
+from lxml import etree
+
+from exemelopy.cache import _SizedCache
+from exemelopy.encoder import (_Children, _TextTarget, _TreeTarget,
+                               _MAX_INDENT, _format_attributes)
+
+
+__all__ = (
+    'FragmentCache',
+    )
+
+
+class FragmentCache(_SizedCache):
+    """Keeps the encoded output of values which are encoded again
+    and again, such as lookup tables or constants, so that they are
+    copied into later documents rather than encoded from scratch.
+
+    Values of ``types`` with at least ``min_size`` items are cached,
+    when given to an encoder as its ``fragment_cache``. Values made
+    only of tuples, frozensets, strings, numbers, booleans and
+    ``None`` are found by what they hold, so equal values share an
+    entry; any other value is found by its identity, and is kept
+    alive by the cache. Either way, a cached value, and anything it
+    holds, must not be changed afterwards, and the cache should be
+    cleared after registering handlers.
+
+    The least recently used entries are dropped once the size of the
+    output held, in approximate bytes, goes over ``maxbytes``. The
+    number of ``hits``, ``misses`` and ``evictions`` are counted for
+    tuning. Only ``to_string``, ``to_xml``, ``iterencode`` and the
+    'text' backend use the cache; ``dump`` with the 'lxml' backend
+    encodes every value as usual.
+
+    A cache may be shared between encoders with different options,
+    and between threads.
+    """
+
+    def __init__(self, maxbytes=4 * 1024 * 1024, types=(tuple, frozenset),
+                 min_size=8):
+        super(FragmentCache, self).__init__(maxbytes)
+        self.types = types
+        self.min_size = min_size
+
+    def _wrap(self, handler):
+        """Returns ``handler`` taking its output from the cache when
+        encoding into an ``lxml`` tree or text."""
+        cache = self
+
+        def cached(encoder, target, data):
+            kind = type(target)
+            if kind is not _TreeTarget and kind is not _TextTarget:
+                return handler(encoder, target, data)
+
+            try:
+                small = len(data) < cache.min_size
+            except TypeError:
+                small = False
+
+            if small:
+                return handler(encoder, target, data)
+
+            if kind is _TreeTarget:
+                cache._encode_tree(encoder, handler, target, data)
+            else:
+                cache._encode_text(encoder, handler, target, data)
+
+        return cached
+
+    def _key(self, encoder, data, variant):
+        key = _value_key(data)
+        if key is None:
+            key = id(data)
+        else:
+            data = None
+
+        # the output also depends on the options of the encoder
+        return ((key, variant, type(encoder), encoder.detect_uuids,
+                 encoder.strict_errors, encoder.profile, encoder.canonical),
+                data)
+
+    def _encode_tree(self, encoder, handler, target, data):
+        key, value = self._key(encoder, data, None)
+        fragment = self._get(key)
+
+        if fragment is None:
+            fragment = etree.Element('fragment')
+            capture = _TreeTarget(fragment)
+
+            children = handler(encoder, capture, data)
+            if children is not None:
+                encoder._encode(capture, _Children(children))
+
+            self._put(key, value, fragment, len(etree.tostring(fragment)))
+
+        element = target.stack[-1]
+        for name, attribute in fragment.attrib.iteritems():
+            element.set(name, attribute)
+
+        element.text = fragment.text
+        if len(fragment):
+            element.extend(list(deepcopy(fragment)))
+
+    def _encode_text(self, encoder, handler, target, data):
+        # the indentation of the children depends on the depth
+        depth = len(target.stack) - 1
+        if not target.indent:
+            depth = 0
+        elif depth > _MAX_INDENT:
+            depth = _MAX_INDENT
+
+        key, value = self._key(encoder, data, (depth, target.indent))
+        fragment = self._get(key)
+
+        if fragment is None:
+            capture = _TextTarget(None, _FRAGMENT, 'UTF-8', target.indent,
+                                  declaration=False)
+            capture.stack = [_OPENED] * depth + [[u'<f', None, None, False,
+                                                  u'</f>']]
+
+            children = handler(encoder, capture, data)
+            if children is not None:
+                encoder._encode(capture, _Children(children))
+
+            # the attributes and text of the element, or what's
+            # written between its tags when it has children
+            head, attrib, text, started, tail = capture.stack[-1]
+            inner = started and u''.join(capture.chunks[1:]) or None
+            fragment = attrib and tuple(attrib), text, inner
+
+            self._put(key, value, fragment, len(inner or text or u'') + 64)
+
+        attrib, text, inner = fragment
+        element = target.stack[-1]
+        if attrib:
+            element[1] = (element[1] or []) + list(attrib)
+
+        if inner is None:
+            element[2] = text
+        else:
+            element[3] = True
+            head = element[0]
+            if element[1]:
+                head += _format_attributes(element[1])
+            target.chunks.append(head + u'>' + inner)
+
+
+def _value_key(value):
+    """Returns a key which is the same for values encoded the same
+    way, or ``None`` when ``value`` holds anything which could
+    change, or be encoded differently while being equal."""
+    kind = type(value)
+
+    if kind in _SCALARS:
+        return kind, value
+
+    if kind is float:
+        # 0.0 == -0.0
+        return kind, repr(value)
+
+    if kind is tuple or kind is frozenset:
+        items = []
+        for item in value:
+            item = _value_key(item)
+            if item is None:
+                return None
+            items.append(item)
+        return kind, tuple(items)
+
+    return None
+
+
+_SCALARS = frozenset((NoneType, bool, int, long, str, unicode))
+
+# the document element of a fragment, which is never written
+_FRAGMENT = etree.Element('fragment')
+
+# an element whose start tag has already been written, standing in
+# for the ancestors of a fragment
+_OPENED = [u'', None, None, True, u'']
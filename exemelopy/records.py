@@ -0,0 +1,391 @@
+from operator import attrgetter
+from types import ClassType, InstanceType, NoneType
+
+try:
+    from collections import OrderedDict  # python 2.7+
+except ImportError:
+    from ordereddict import OrderedDict
+
+from lxml import etree
+
+import exemelopy.encoder
+from exemelopy.encoder import (EncoderConfig, XMLEncoder,
+                               _PROCESSING_INSTRUCTION, _Records,
+                               _is_public)
+
+
+__all__ = (
+    'RecordEncoder',
+    )
+
+
+class RecordEncoder(object):
+    """Encodes lists of records which all have the same shape as
+    ``sample``, producing the same output as ``EncoderConfig``
+    in less time.
+
+    ``sample`` may be a ``dict``, an object whose attributes are
+    encoded, a class which defines ``__slots__``, or a namedtuple
+    or its class. The element for each field, and the handler for the
+    type of each value, are worked out once, and a function which
+    encodes a record with the same fields in the same order is
+    generated from them. Records of any other shape, and values of
+    any other type, are encoded as usual.
+
+    The remaining arguments are those of ``EncoderConfig``; like
+    a config, a record encoder cannot be changed once created.
+    """
+
+    __slots__ = ('sample', 'config', '_encoders')
+
+    def __init__(self, sample, indent=True, declaration=True,
+                 cls=XMLEncoder, **options):
+        config = EncoderConfig(indent, declaration, cls, **options)
+
+        set_ = super(RecordEncoder, self).__setattr__
+        set_('sample', sample)
+        set_('config', config)
+        encoder = config._encoder
+        if encoder.compact or encoder.canonical or encoder.references:
+            # the generated functions only write the 'standard' profile,
+            # with the fields in the order of the sample, and never
+            # write references
+            set_('_encoders', None)
+        else:
+            # with the number of handlers registered when generated
+            set_('_encoders', (exemelopy.encoder._registrations,
+                               _compile(config._encoder, sample)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('%s objects cannot be changed'
+                             % self.__class__.__name__)
+
+    def __reduce__(self):
+        config = self.config
+        return (_restore_encoder, (self.sample, config.indent,
+                                   config.declaration,
+                                   type(config._encoder), config.options))
+
+    def dumps(self, rows):
+        """Encodes the records in ``rows`` to XML and returns
+        a ``string``."""
+        return self.config.dumps(self._wrap(rows))
+
+    def dump(self, rows, fp):
+        """Encodes the records in ``rows`` to XML and writes it
+        incrementally to ``fp``, which may be a file-like object
+        or a filename."""
+        self.config.dump(self._wrap(rows), fp)
+
+    def _wrap(self, rows):
+        if not rows or self._encoders is None:
+            return rows
+
+        registrations, encoders = self._encoders
+        if registrations != exemelopy.encoder._registrations:
+            # handlers registered since may replace those the
+            # functions were generated for
+            registrations = exemelopy.encoder._registrations
+            try:
+                encoders = _compile(self.config._encoder, self.sample)
+            except TypeError:
+                # such as one for the records themselves
+                encoders = None
+
+            super(RecordEncoder, self).__setattr__(
+                '_encoders', (registrations, encoders))
+
+        if encoders is None:
+            return rows
+
+        return _Records(rows, *encoders)
+
+
+def _restore_encoder(sample, indent, declaration, cls, options):
+    return RecordEncoder(sample, indent, declaration, cls, **options)
+
+
+def _compile(encoder, sample):
+    """Returns the functions which encode a record shaped like
+    ``sample`` into the element open on a ``_TreeTarget``, and on any
+    other target, returning ``False`` without writing anything for
+    any other record."""
+    if isinstance(sample, (type, ClassType)):
+        datatype = sample
+        sample = None
+    else:
+        datatype = type(sample)
+        if datatype is InstanceType:
+            datatype = sample.__class__
+
+    handler = type(encoder)._resolve(datatype)
+
+    if handler == XMLEncoder._encode_mapping and sample is not None:
+        if not _is_ordered(datatype):
+            raise TypeError('the keys of %s are not ordered consistently'
+                            % datatype)
+
+        fields = [(name, encoder._element_name(name), value)
+                  for name, value in sample.iteritems()]
+        container = None
+        source = 'record'
+
+    elif handler == XMLEncoder._encode_object and sample is not None:
+        fields = [(name,
+                   _is_public(name) and encoder._field_element(name) or None,
+                   value)
+                  for name, value in sample.__dict__.iteritems()]
+        container = unicode(datatype.__name__)
+        source = 'record.__dict__'
+
+    elif handler in (XMLEncoder._encode_slots,
+                     XMLEncoder._encode_namedtuple):
+        if handler == XMLEncoder._encode_slots:
+            names = datatype.__slots__
+            if isinstance(names, basestring):
+                names = (names,)
+            names = [name for name in names if _is_public(name)]
+        else:
+            names = datatype._fields
+
+        fields = [(name, encoder._field_element(name),
+                   sample is None and _UNKNOWN or getattr(sample, name))
+                  for name in names]
+        container = unicode(datatype.__name__)
+        return tuple(_generate(encoder, datatype, fields, container, tree)
+                     for tree in (True, False))
+
+    else:
+        raise TypeError('cannot compile an encoder for records of %s'
+                        % datatype)
+
+    # records with the same keys can still list them in a different
+    # order, depending on how they were built; a function is generated
+    # for each order as it is seen
+    by_name = dict((field[0], field) for field in fields)
+    variants = {}
+
+    def reorderer(tree):
+        def reorder(self, target, record, keys):
+            order = tree, tuple(keys)
+            try:
+                encode_record = variants[order]
+            except KeyError:
+                encode_record = None
+                if (len(keys) == len(by_name)
+                    and all(name in by_name for name in keys)):
+                    encode_record = _generate(
+                        encoder, datatype, [by_name[name] for name in keys],
+                        container, tree, source)
+
+                if len(variants) < _MAX_VARIANTS:
+                    variants[order] = encode_record
+
+            if encode_record is None:
+                return False
+
+            return encode_record(self, target, record)
+
+        return reorder
+
+    return tuple(_generate(encoder, datatype, fields, container, tree,
+                           source, reorderer(tree))
+                 for tree in (True, False))
+
+
+def _generate(encoder, datatype, fields, container, tree, source=None,
+              reorder=None):
+    """Generates the function for records of ``datatype`` with the
+    ``(name, element, sample value)`` of ``fields``, in order.
+
+    The fields are read from the attributes of ``__slots__`` records,
+    or from the mapping ``source`` otherwise, which must list the same
+    keys in the same order; ``reorder`` is called with any other
+    keys. When ``tree`` is set the elements are created directly
+    beneath the open element of a ``_TreeTarget``, rather than through
+    the target's methods."""
+    namespace = {'RECORD': datatype, 'SubElement': etree.SubElement}
+
+    if isinstance(datatype, ClassType):
+        lines = ['if type(record) is not InstanceType '
+                 'or record.__class__ is not RECORD:']
+        namespace['InstanceType'] = InstanceType
+    else:
+        lines = ['if type(record) is not RECORD:']
+
+    lines.append('    return False')
+
+    names = [field[0] for field in fields]
+    values = ', '.join('v%d' % i for i in xrange(len(fields)))
+
+    if source is None:
+        if names:
+            namespace['FIELDS'] = attrgetter(*names)
+            lines.append('%s, = %s' % (
+                values,
+                len(names) == 1 and '(FIELDS(record),)' or 'FIELDS(record)'))
+
+    else:
+        namespace['KEYS'] = names
+        namespace['REORDER'] = reorder
+        lines.extend([
+            'fields = %s' % source,
+            'keys = fields.keys()',
+            'if keys != KEYS:',
+            reorder is None and '    return False'
+            or '    return REORDER(self, target, record, keys)',
+            ])
+        if names:
+            lines.append('%s, = fields.values()' % values)
+
+    if tree:
+        lines.extend([
+            'stack = target.stack',
+            'parent = stack[-1]',
+            ])
+    else:
+        lines.extend([
+            'start = target.start',
+            'end = target.end',
+            'set_ = target.set',
+            'text = target.text',
+            ])
+
+    lines.append('encode = self._encode')
+
+    if container is not None:
+        namespace['CONTAINER'] = container
+        namespace['CONTAINER_ATTRIB'] = {'nodetype': u'container'}
+        lines.append(tree
+                     and 'parent = SubElement(parent, '
+                         'CONTAINER, CONTAINER_ATTRIB)'
+                     or 'start(CONTAINER, CONTAINER_ATTRIB)')
+
+    emitters = _emitters(encoder)
+    namespace.update(_types)
+    namespace['is_uuid'] = encoder._is_uuid.match
+
+    if tree:
+        fallback = ['stack.append(e)',
+                    'encode(target, %(v)s)',
+                    'stack.pop()']
+    else:
+        fallback = ['encode(target, %(v)s)']
+
+    for i, (name, element, value) in enumerate(fields):
+        if element is None:
+            continue
+
+        var = 'v%d' % i
+        if element is _PROCESSING_INSTRUCTION:
+            lines.append('self._add_processing_instruction(target, %s)'
+                         % var)
+            continue
+
+        namespace['T%d' % i] = element[0]
+        namespace['A%d' % i] = element[1]
+        lines.append(tree
+                     and 'e = SubElement(parent, T%d, A%d)' % (i, i)
+                     or 'start(T%d, A%d)' % (i, i))
+
+        if value is _UNKNOWN:
+            candidates = [t for t in _types.values() if t in emitters]
+        else:
+            candidates = [t for t in (type(value),) if t in emitters]
+
+        if candidates:
+            lines.append('t = type(%s)' % var)
+            for n, kind in enumerate(candidates):
+                lines.append('%s t is %s:' % (n and 'elif' or 'if',
+                                              kind.__name__))
+                lines.extend('    ' + line
+                             for line in _render(emitters[kind], var, tree))
+            lines.append('else:')
+            lines.extend('    ' + line % {'v': var} for line in fallback)
+        else:
+            lines.extend(line % {'v': var} for line in fallback)
+
+        if not tree:
+            lines.append('end()')
+
+    if container is not None and not tree:
+        lines.append('end()')
+
+    lines.append('return True')
+
+    code = 'def encode_record(self, target, record):\n%s\n' % '\n'.join(
+        '    ' + line for line in lines)
+
+    exec compile(code, '<record encoder>', 'exec') in namespace
+    return namespace['encode_record']
+
+
+def _emitters(encoder):
+    """Returns the steps replacing the built-in handlers of the
+    types in ``_types`` which ``encoder`` still uses, by type."""
+    resolve = type(encoder)._resolve
+
+    uuid = encoder.detect_uuids and [('uuid', None)] or []
+    scalar = [('text', 'unicode(%(v)s)')]
+
+    inline = {
+        NoneType: (XMLEncoder._encode_none, []),
+        bool: (XMLEncoder._encode_boolean,
+               [('set', "u'boolean'"),
+                ('text', "%(v)s and u'true' or u'false'")]),
+        int: (XMLEncoder._encode_scalar, scalar),
+        long: (XMLEncoder._encode_scalar, scalar),
+        float: (XMLEncoder._encode_scalar, scalar),
+        str: (XMLEncoder._encode_string,
+              uuid + [('text', "unicode(%(v)s, 'latin1')")]),
+        unicode: (XMLEncoder._encode_string, uuid + [('text', '%(v)s')]),
+        }
+
+    return dict((datatype, steps)
+                for datatype, (handler, steps) in inline.iteritems()
+                if resolve(datatype) == handler)
+
+
+def _render(steps, var, tree):
+    """Returns the lines of code for the ``steps`` of an emitter,
+    applied to the value in ``var``."""
+    if tree:
+        forms = {'set': "e.set('nodetype', %s)", 'text': 'e.text = %s'}
+    else:
+        forms = {'set': "set_('nodetype', %s)", 'text': 'text(%s)'}
+
+    lines = []
+    for step, argument in steps:
+        if step == 'uuid':
+            lines.extend([
+                'if len(%(v)s) in (36, 38) and is_uuid(%(v)s):',
+                '    ' + forms['set'] % "u'uuid'",
+                ])
+        else:
+            lines.append(forms[step] % argument)
+
+    return [line % {'v': var} for line in lines] or ['pass']
+
+
+def _is_ordered(datatype):
+    """Whether ``keys`` and ``values`` of a ``datatype`` mapping
+    follow the same order as ``iteritems``."""
+    if issubclass(datatype, OrderedDict):
+        return True
+
+    return (issubclass(datatype, dict)
+            and datatype.keys is dict.keys
+            and datatype.values is dict.values
+            and datatype.iteritems is dict.iteritems)
+
+
+# the types with inline handlers, by name; checked in this order
+# for fields whose type isn't known from a sample
+_types = OrderedDict((datatype.__name__, datatype) for datatype in (
+    unicode, str, int, float, NoneType, bool, long))
+
+# marks a field without a sample value
+_UNKNOWN = object()
+
+# the most orders of the same keys to generate functions for
+_MAX_VARIANTS = 16
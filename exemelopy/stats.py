@@ -0,0 +1,267 @@
+from timeit import default_timer
+
+from exemelopy.encoder import _Children
+
+
+__all__ = (
+    'EncoderStats',
+    )
+
+
+class EncoderStats(object):
+    """Counts and times the work of the encoders it is given to, as
+    the ``stats`` argument of ``XMLEncoder``, ``EncoderConfig`` or
+    ``dumps``.
+
+    For each branch of the type rules, the number of values which
+    took it and the time spent in it are recorded in ``branches``.
+    The time includes reading the keys, attributes or items of a
+    value, but not encoding them, except for registered handlers,
+    whose time includes encoding the value they return. The
+    'element_name' branch covers finding the element for each mapping
+    key, whether it is worked out or found in the cache shared by
+    encoders, 'invalid_name' those keys which aren't valid names, and
+    'uuid_sniff' checking strings for UUIDs.
+
+    Overall, the number of ``documents``, the ``elements`` written
+    below their document elements, the ``max_depth`` of any element,
+    and the seconds spent encoding (``encode_time``) and serializing
+    the result (``serialize_time``) are kept. When writing text
+    directly, or streaming with ``dump``, the output is serialized as
+    it is encoded, and is included in ``encode_time``; with
+    ``iterencode`` and ``async_dump``, only the time spent encoding
+    is counted, not the time between chunks.
+
+    Encoders without stats aren't slowed down at all; those with
+    them take around twice as long. A single ``EncoderStats`` can be
+    given to many encoders, but isn't thread-safe.
+    """
+
+    def __init__(self, clock=default_timer):
+        self.clock = clock
+        self._branches = {}
+        self.reset()
+
+    def reset(self):
+        """Sets every count and time back to zero."""
+        self.documents = 0
+        self.elements = 0
+        self.max_depth = 0
+        self.encode_time = 0.0
+        self.serialize_time = 0.0
+
+        # the branches are kept by the encoders attached, so are
+        # emptied rather than replaced
+        for branch in self._branches.itervalues():
+            branch[:] = [0, 0.0]
+
+    @property
+    def branches(self):
+        """The ``(hits, seconds)`` of each branch taken, by name."""
+        return dict((name, tuple(branch))
+                    for name, branch in self._branches.iteritems()
+                    if branch[0])
+
+    def as_dict(self):
+        """Returns the stats as a ``dict`` of plain values, such as
+        for exporting to a metrics system."""
+        return {
+            'documents': self.documents,
+            'elements': self.elements,
+            'max_depth': self.max_depth,
+            'encode_time': self.encode_time,
+            'serialize_time': self.serialize_time,
+            'branches': dict((name, {'hits': hits, 'time': seconds})
+                             for name, (hits, seconds)
+                             in self.branches.iteritems()),
+            }
+
+    def __repr__(self):
+        return ('<%s documents=%d elements=%d max_depth=%d '
+                'encode_time=%.6f serialize_time=%.6f>' % (
+                    self.__class__.__name__, self.documents, self.elements,
+                    self.max_depth, self.encode_time, self.serialize_time))
+
+    def _branch(self, name):
+        return self._branches.setdefault(name, [0, 0.0])
+
+    def _measure_handler(self, handler):
+        """Returns ``handler`` counting and timing into its branch,
+        named after it."""
+        name = getattr(handler, '__name__', '')
+        if name.startswith('_encode_'):
+            name = name[len('_encode_'):]
+        else:
+            name = 'registered'
+
+        branch = self._branch(name)
+        clock = self.clock
+
+        def measured(encoder, target, data):
+            started = clock()
+            children = handler(encoder, target, data)
+            branch[0] += 1
+            branch[1] += clock() - started
+
+            if children is not None:
+                return _measure_children(children, branch, clock)
+
+        return measured
+
+    def _measure_element_name(self, element_name):
+        branch = self._branch('element_name')
+        invalid = self._branch('invalid_name')
+        clock = self.clock
+
+        def measured(name):
+            started = clock()
+            element = element_name(name)
+            elapsed = clock() - started
+
+            branch[0] += 1
+            branch[1] += elapsed
+            if type(element) is tuple and element[1]:
+                # <node name="...">
+                invalid[0] += 1
+                invalid[1] += elapsed
+
+            return element
+
+        return measured
+
+    def _measure_name_cache(self, names):
+        return _MeasuredNames(names, self._branch('element_name'),
+                              self._branch('invalid_name'), self.clock)
+
+    def _measure_pattern(self, pattern, name):
+        return _MeasuredPattern(pattern, self._branch(name), self.clock)
+
+    def _measure_target(self, target):
+        return _MeasuredTarget(target, self)
+
+    def _measure_steps(self, steps):
+        """Passes on what the generator ``steps`` yields and is sent,
+        counting the time it runs for as encoding a document."""
+        clock = self.clock
+        result = None
+        self.documents += 1
+
+        while True:
+            started = clock()
+            try:
+                value = steps.send(result)
+            except StopIteration:
+                self.encode_time += clock() - started
+                return
+
+            self.encode_time += clock() - started
+            result = yield value
+
+
+def _measure_children(children, branch, clock):
+    """Yields each of ``children``, adding the time taken to produce
+    it to ``branch``; the children of containers are measured in the
+    same way, as reading them is the work of the same branch."""
+    children = iter(children)
+
+    while True:
+        started = clock()
+        try:
+            tag, attrib, value = next(children)
+        except StopIteration:
+            branch[1] += clock() - started
+            return
+
+        branch[1] += clock() - started
+
+        if type(value) is _Children:
+            value = _Children(_measure_children(value.children, branch,
+                                                clock))
+
+        yield tag, attrib, value
+
+
+class _MeasuredPattern(object):
+    """Counts and times calls to ``match`` of a compiled pattern."""
+
+    __slots__ = ('pattern', 'branch', 'clock')
+
+    def __init__(self, pattern, branch, clock):
+        self.pattern = pattern
+        self.branch = branch
+        self.clock = clock
+
+    def match(self, string):
+        started = self.clock()
+        match = self.pattern.match(string)
+        self.branch[0] += 1
+        self.branch[1] += self.clock() - started
+        return match
+
+
+class _MeasuredNames(object):
+    """Passes lookups on to ``names``, the cache of the elements for
+    mapping keys, counting and timing each element found there as
+    ``_measure_element_name`` does those worked out; the counts are
+    then the same whatever was encoded before."""
+
+    __slots__ = ('names', 'branch', 'invalid', 'clock')
+
+    def __init__(self, names, branch, invalid, clock):
+        self.names = names
+        self.branch = branch
+        self.invalid = invalid
+        self.clock = clock
+
+    def get(self, name, default=None):
+        started = self.clock()
+        element = self.names.get(name, default)
+        if element is default:
+            return element
+
+        elapsed = self.clock() - started
+        self.branch[0] += 1
+        self.branch[1] += elapsed
+        if type(element) is tuple and element[1]:
+            # <node name="...">
+            self.invalid[0] += 1
+            self.invalid[1] += elapsed
+
+        return element
+
+    def __setitem__(self, name, element):
+        self.names[name] = element
+
+
+class _MeasuredTarget(object):
+    """Passes everything on to ``target``, counting the elements
+    started and their depth."""
+
+    def __init__(self, target, stats):
+        self.target = target
+        self.stats = stats
+        self.depth = 0
+
+        self.set = target.set
+        self.text = target.text
+
+        flush = getattr(target, 'flush', None)
+        if flush is not None:
+            self.flush = flush
+
+        stream_text = getattr(target, 'stream_text', None)
+        if stream_text is not None:
+            self.stream_text = stream_text
+
+    def start(self, tag, attrib=None):
+        self.target.start(tag, attrib)
+
+        self.depth += 1
+        stats = self.stats
+        stats.elements += 1
+        if self.depth > stats.max_depth:
+            stats.max_depth = self.depth
+
+    def end(self):
+        self.target.end()
+        self.depth -= 1
@@ -21,7 +21,7 @@ setup(name="exemelopy",
       author_email=__author_email__,
       packages=find_packages(exclude=["specs", "benchmark"]),
       install_requires=[
-          'lxml',
+          'lxml>=3.1',
           'ordereddict'
       ],
       )
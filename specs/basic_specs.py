@@ -1,9 +1,31 @@
 from collections import MutableMapping as DictMixin
+import StringIO
+import bz2
+import cStringIO
 import datetime
+import gzip
+import io
+import mmap
 import os
 import sys
 import tempfile
 import unittest
+import uuid
+from array import array
+from collections import deque, namedtuple
+from itertools import chain, imap
+
+from nose.plugins.skip import SkipTest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    binary_view = memoryview  # python 2.7+
+except NameError:
+    binary_view = buffer
 
 try:
     from io import BytesIO  # python 3
@@ -23,6 +45,14 @@ class PlainObject(object):
     pass
 
 
+class ComplexIterable(object):
+    def __init__(self):
+        self.items = [1, 2]
+
+    def __iter__(self):
+        return iter(self.items)
+
+
 class ComplexObject(DictMixin):
     def __init__(self):
         self.dict = dict()
@@ -219,6 +249,30 @@ class ObjectSpec(CommonBaseSpec):
 
         self._format_each_should_equal(tests)
 
+    def it_should_format_iterators_and_iterables(self):
+        lines = tempfile.TemporaryFile('w+')
+        lines.write('a\nb\n')
+        lines.seek(0)
+
+        expected = ('<?xml version=\'1.0\' encoding=\'UTF-8\'?>\n'
+                    '<document nodetype="generated-list">\n  '
+                    '<i>%s</i>\n  <i>%s</i>\n</document>\n')
+
+        tests = (
+            (iter([1, 2]), expected % (1, 2)),
+            (imap(str, 'ab'), expected % ('a', 'b')),
+            (chain([1], [2]), expected % (1, 2)),
+            (xrange(1, 3), expected % (1, 2)),
+            (deque('ab'), expected % ('a', 'b')),
+            (lines, expected % ('a\n', 'b\n')),
+            (ComplexIterable(), expected % (1, 2)),
+            (frozenset([1]),
+             '<?xml version=\'1.0\' encoding=\'UTF-8\'?>\n'
+             '<document nodetype="unique-list">\n  <i>1</i>\n</document>\n'),
+            )
+
+        self._format_each_should_equal(tests)
+
     def it_should_format_complex_objects(self):
 
         nesteddict = {
@@ -320,19 +374,1308 @@ class ObjectSpec(CommonBaseSpec):
 
     def it_should_format_io_objects(self):
         tests = (
-            ({'data': BytesIO('this is some data')},
+            ({'data': io.BytesIO('this is some data\x00')},
              "<?xml version='1.0' encoding='UTF-8'?>\n<document>\n  "
-             "<data>this is some data</data>\n</document>\n"),
+             '<data nodetype="binary">dGhpcyBpcyBzb21lIGRhdGEA</data>\n'
+             "</document>\n"),
+            )
+
+        self._format_each_should_equal(tests)
+
+    def it_should_format_binary_values_as_base64(self):
+        tests = (
+            ([bytearray('\x00\xff'), binary_view('abc'), bytearray()],
+             "<?xml version='1.0' encoding='UTF-8'?>\n"
+             '<document nodetype="list">\n'
+             '  <i nodetype="binary">AP8=</i>\n'
+             '  <i nodetype="binary">YWJj</i>\n'
+             '  <i nodetype="binary"></i>\n'
+             '</document>\n'),
+            )
+
+        self._format_each_should_equal(tests)
+
+    def it_should_format_binary_files_as_base64(self):
+        handle, path = tempfile.mkstemp()
+        os.write(handle, '\x00\xff')
+        os.close(handle)
+
+        output = cStringIO.StringIO()
+        output.write('\x00\xff')
+
+        try:
+            for profile in XMLEncoder._profiles:
+                for stream in (open(path, 'rb'), output,
+                               cStringIO.StringIO('\x00\xff'),
+                               StringIO.StringIO('\x00\xff')):
+                    self.assertEqual(
+                        loads(dumps({'f': stream}, profile=profile)),
+                        {'f': '\x00\xff'})
+        finally:
+            os.remove(path)
+
+    def it_should_dump_large_binary_values_in_pieces(self):
+        data = {'blob': bytearray(os.urandom(200000))}
+        expected = XMLEncoder(data).to_string()
+
+        for backend in XMLEncoder._backends:
+            output = BytesIO()
+            XMLEncoder(data, backend=backend).dump(output)
+            self.assertEqual(output.getvalue(), expected)
+
+    def it_should_format_namedtuples_as_containers(self):
+        tests = (
+            (Point(1, None),
+             "<?xml version='1.0' encoding='UTF-8'?>\n<document>\n  "
+             '<Point nodetype="container">\n    <x>1</x>\n    <y/>\n  '
+             "</Point>\n</document>\n"),
+            )
+
+        self._format_each_should_equal(tests)
+
+    def it_should_format_each_object_of_a_class_by_its_attributes(self):
+        first = PlainObject()
+        first.a = 1
+        second = PlainObject()
+        second.b = 2
+        second._c = 3
+        setattr(second, 'not a name', 4)
+
+        tests = (
+            ([first, second],
+             "<?xml version='1.0' encoding='UTF-8'?>\n"
+             '<document nodetype="list">\n  <i>\n'
+             '    <PlainObject nodetype="container">\n'
+             '      <a>1</a>\n    </PlainObject>\n  </i>\n  <i>\n'
+             '    <PlainObject nodetype="container">\n'
+             '      <node name="not a name">4</node>\n      <b>2</b>\n'
+             "    </PlainObject>\n  </i>\n</document>\n"),
+            )
+
+        self._format_each_should_equal(tests)
+
+
+class NestingSpec(CommonBaseSpec):
+
+    def _nested(self, depth):
+        data = 'leaf'
+        for i in xrange(depth):
+            if i % 3 == 0:
+                data = {'a': data}
+            elif i % 3 == 1:
+                data = [data]
+            else:
+                obj = PlainObject()
+                obj.b = data
+                data = obj
+        return data
+
+    def it_should_format_data_deeper_than_the_recursion_limit(self):
+        depth = sys.getrecursionlimit() * 10
+        output = XMLEncoder(self._nested(depth)).to_string(indent=False)
+
+        self.assertEqual(output.count('<PlainObject nodetype="container">'),
+                         depth / 3)
+        self.assertTrue('<a>leaf</a>' in output)
+
+    def it_should_dump_deeply_nested_data(self):
+        data = self._nested(100)
+        output = BytesIO()
+        XMLEncoder(data).dump(output)
+
+        self.assertEqual(output.getvalue(), XMLEncoder(data).to_string())
+
+
+class Money(object):
+    def __init__(self, amount, currency):
+        self.amount = amount
+        self.currency = currency
+
+
+class RegisterSpec(CommonBaseSpec):
+
+    def it_should_use_registered_handlers(self):
+        class MoneyEncoder(XMLEncoder):
+            pass
+
+        MoneyEncoder.register(
+            Money, lambda value: '%s %s' % (value.amount, value.currency))
+
+        self.assertEqual(
+            MoneyEncoder({'price': Money(10, 'GBP')}).to_string(),
+            "<?xml version='1.0' encoding='UTF-8'?>\n<document>\n  "
+            "<price>10 GBP</price>\n</document>\n")
+
+        # the base encoder is left untouched
+        self.assertTrue(
+            '<Money nodetype="container">' in
+            XMLEncoder({'price': Money(10, 'GBP')}).to_string())
+
+    def it_should_use_registered_handlers_for_subclasses(self):
+        class Euros(Money):
+            pass
+
+        class MoneyEncoder(XMLEncoder):
+            pass
+
+        MoneyEncoder.register(Money, lambda value: [value.amount])
+
+        self.assertEqual(
+            MoneyEncoder(Euros(5, 'EUR')).to_string(indent=False),
+            "<?xml version='1.0' encoding='UTF-8'?>\n"
+            '<document nodetype="list"><i>5</i></document>')
+
+    def it_should_use_handlers_registered_on_base_classes_later(self):
+        class BaseEncoder(XMLEncoder):
+            pass
+
+        class MoneyEncoder(BaseEncoder):
+            pass
+
+        MoneyEncoder.register(Money, lambda value: value.currency)
+        MoneyEncoder(Money(1, 'GBP')).to_string()
+
+        BaseEncoder.register(Money, lambda value: value.amount)
+        BaseEncoder.register(PlainObject, lambda value: 'plain')
+
+        self.assertEqual(MoneyEncoder(Money(1, 'GBP')).to_string(False),
+                         "<?xml version='1.0' encoding='UTF-8'?>\n"
+                         '<document>GBP</document>')
+        self.assertEqual(MoneyEncoder(PlainObject()).to_string(False),
+                         "<?xml version='1.0' encoding='UTF-8'?>\n"
+                         '<document>plain</document>')
+
+    def it_should_use_handlers_registered_after_encoding(self):
+        class MoneyEncoder(XMLEncoder):
+            pass
+
+        configs = [EncoderConfig(indent=False, declaration=False,
+                                 cls=MoneyEncoder, **options)
+                   for options in ({}, {'stats': EncoderStats()},
+                                   {'profile': 'compact'},
+                                   {'canonical': True},
+                                   {'references': True})]
+
+        for config in configs:
+            self.assertTrue('GBP' in config.dumps(Money(10, 'GBP')))
+
+        MoneyEncoder.register(Money, lambda value: value.amount)
+
+        for config in configs:
+            self.assertFalse('GBP' in config.dumps(Money(10, 'GBP')))
+            self.assertTrue('10' in config.dumps(Money(10, 'GBP')))
+
+    def it_should_keep_the_handlers_of_each_class_apart(self):
+        class TextEncoder(XMLEncoder):
+            def _encode_scalar(self, target, data):
+                target.text(u'number')
+
+        self.assertEqual(TextEncoder(1).to_string(False),
+                         "<?xml version='1.0' encoding='UTF-8'?>\n"
+                         '<document>number</document>')
+        self.assertEqual(XMLEncoder(1).to_string(False),
+                         "<?xml version='1.0' encoding='UTF-8'?>\n"
+                         '<document>1</document>')
+
+
+class NameCacheSpec(CommonBaseSpec):
+
+    def it_should_cache_the_elements_used_for_keys(self):
+        class CachingEncoder(XMLEncoder):
+            name_cache = LRUCache(maxsize=16)
+
+        data = [{'a': 1, 'long title': 2, 3: 4}] * 3
+        self.assertEqual(CachingEncoder(data).to_string(),
+                         XMLEncoder(data).to_string())
+
+        # integer keys are not cached
+        self.assertEqual(CachingEncoder.name_cache.misses, 2)
+        self.assertEqual(CachingEncoder.name_cache.hits, 4)
+        self.assertEqual(len(CachingEncoder.name_cache), 2)
+
+    def it_should_evict_entries_unused_the_longest(self):
+        cache = LRUCache(maxsize=4)
+        cache['a'] = 1
+        cache['b'] = 2
+        cache['c'] = 3
+        cache.get('a')
+        cache['d'] = 4
+        cache['e'] = 5
+
+        self.assertTrue('a' in cache)
+        self.assertTrue('e' in cache)
+        self.assertFalse('b' in cache)
+        self.assertTrue(len(cache) <= 4)
+
+    def it_should_reset_the_counters_when_cleared(self):
+        cache = LRUCache()
+        cache['a'] = 1
+        cache.get('a')
+        cache.get('b')
+        cache.clear()
+
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 0, 0))
+
+
+class StreamingSpec(CommonBaseSpec):
+
+    def _dump(self, data, **kwargs):
+        output = BytesIO()
+        XMLEncoder(data).dump(output, **kwargs)
+        return output.getvalue()
+
+    def it_should_dump_the_same_bytes_as_to_string(self):
+        test_object = PlainObject()
+        test_object.bar = 'baz'
+
+        tests = (
+            None,
+            'test',
+            [1, 2, 3],
+            {'foo': {'bar': 'baz'}, 'long title': '', 1: None},
+            {'a': (1, [True, False], set([1])), 'b': []},
+            datetime.datetime(2010, 2, 1, 0, 0),
+            test_object,
+            )
+
+        for test in tests:
+            for indent in (True, False):
+                for declaration in (True, False):
+                    self.assertEqual(
+                        self._dump(test, indent=indent,
+                                   declaration=declaration),
+                        XMLEncoder(test).to_string(indent=indent,
+                                                   declaration=declaration))
+
+    def it_should_dump_non_ascii_attributes_as_to_string(self):
+        tests = (
+            {u'\xe9t\xe9': {'a': 1}},
+            [{u'\u2603': [1]}],
+            {'a': u'\xe9', 'b': [u'\u2603']},
+            )
+
+        for test in tests:
+            for profile in XMLEncoder._profiles:
+                output = BytesIO()
+                XMLEncoder(test, profile=profile).dump(output)
+                self.assertEqual(
+                    output.getvalue(),
+                    XMLEncoder(test, profile=profile).to_string())
+
+            output = BytesIO()
+            dump(test, output)
+            self.assertEqual(output.getvalue(), dumps(test))
+
+    def it_should_dump_generator_objects(self):
+        self.assertEqual(
+            self._dump((i for i in xrange(1, 4))),
+            '<?xml version=\'1.0\' encoding=\'UTF-8\'?>\n'
+            '<document nodetype="generated-list">\n  '
+            '<i>1</i>\n  <i>2</i>\n  <i>3</i>\n</document>\n')
+
+    def it_should_write_generated_items_as_they_are_produced(self):
+        for backend in XMLEncoder._backends:
+            output = BytesIO()
+            written = []
+
+            def items():
+                for i in xrange(3):
+                    written.append(output.getvalue())
+                    yield i
+
+            XMLEncoder(items(), backend=backend).dump(output)
+
+            self.assertEqual(written[0], '')
+            self.assertTrue(written[1].endswith('<i>0</i>'))
+            self.assertTrue(written[2].endswith('<i>1</i>'))
+
+    def it_should_iterencode_the_same_bytes_as_to_string(self):
+        data = [{'n': i, 's': u'\xe9' * (i % 20)} for i in xrange(2000)]
+
+        for options in ({}, {'encoding': 'UTF-16', 'backend': 'text'},
+                        {'nsmap': {'x': 'http://x'}}):
+            for indent in (True, False):
+                for declaration in (True, False):
+                    encoder = XMLEncoder(data, **options)
+                    chunks = list(encoder.iterencode(indent, declaration,
+                                                     chunk_size=4096))
+
+                    self.assertTrue(len(chunks) > 1)
+                    self.assertTrue(all(len(chunk) >= 4096
+                                        for chunk in chunks[:-1]))
+                    self.assertEqual(''.join(chunks),
+                                     encoder.to_string(indent, declaration))
+
+    def it_should_iterencode_empty_documents(self):
+        for data in (None, [], {'a': None}):
+            self.assertEqual(list(XMLEncoder(data).iterencode()),
+                             [XMLEncoder(data).to_string()])
+
+    def it_should_iterencode_with_a_config(self):
+        config = EncoderConfig(indent=False)
+
+        self.assertEqual(''.join(config.iterencode([1, 2], chunk_size=1)),
+                         config.dumps([1, 2]))
+
+    def it_should_dump_to_a_filename(self):
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            XMLEncoder({'a': 1}).dump(path)
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(),
+                                 XMLEncoder({'a': 1}).to_string())
+        finally:
+            os.remove(path)
+
+
+class DumpsSpec(CommonBaseSpec):
+
+    def it_should_dump_the_same_string_as_xmlencoder(self):
+        tests = (
+            None,
+            123,
+            {'a': 1},
+            {'foo': {'bar': [1, 2, 3]}, 'long title': True},
+            )
+
+        for test in tests:
+            self.assertEqual(dumps(test), XMLEncoder(test).to_string())
+            self.assertEqual(
+                dumps(test, doc_el='root', indent=False, declaration=False),
+                XMLEncoder(test, doc_el='root').to_string(
+                    indent=False, declaration=False))
+
+    def it_should_dump_to_files(self):
+        output = BytesIO()
+        dump({'a': [1, 2]}, output)
+
+        self.assertEqual(output.getvalue(),
+                         XMLEncoder({'a': [1, 2]}).to_string())
+
+    def it_should_reuse_configs(self):
+        config = EncoderConfig(doc_el='root', indent=False,
+                               attrib={'version': '1'})
+
+        for test in ({'a': 1}, [1, 2], 'test'):
+            self.assertEqual(
+                config.dumps(test),
+                XMLEncoder(test, doc_el='root',
+                           attrib={'version': '1'}).to_string(indent=False))
+
+    def it_should_not_allow_configs_to_change(self):
+        config = EncoderConfig()
+
+        def change():
+            config.indent = False
+
+        self.assertRaises(AttributeError, change)
+
+    def it_should_share_configs_between_threads(self):
+        import threading
+
+        config = EncoderConfig()
+        data = [{'a': i, 'b': [True, None]} for i in xrange(50)]
+        expected = XMLEncoder(data).to_string()
+        results = []
+
+        def encode():
+            for _ in xrange(20):
+                results.append(config.dumps(data))
+
+        threads = [threading.Thread(target=encode) for _ in xrange(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [expected] * 80)
+
+
+class BatchSpec(CommonBaseSpec):
+
+    def _payloads(self):
+        return [{'a': i, 'b': [True, None], 'c': 'x' * i} for i in xrange(40)]
+
+    def it_should_encode_many_payloads_in_order(self):
+        expected = [XMLEncoder(data).to_string() for data in self._payloads()]
+
+        self.assertEqual(
+            list(encode_many(self._payloads(), workers=2, chunksize=3)),
+            expected)
+
+    def it_should_encode_many_payloads_on_threads(self):
+        expected = [XMLEncoder(data, doc_el='row').to_string(indent=False)
+                    for data in self._payloads()]
+
+        self.assertEqual(
+            list(encode_many(iter(self._payloads()), workers=2, threads=True,
+                             chunksize=5, max_pending=1,
+                             doc_el='row', indent=False)),
+            expected)
+
+    def it_should_stop_encoding_when_closed(self):
+        outputs = encode_many(iter(self._payloads()), workers=2, chunksize=1)
+
+        self.assertEqual(outputs.next(),
+                         XMLEncoder(self._payloads()[0]).to_string())
+        outputs.close()
+
+
+class UUIDSpec(CommonBaseSpec):
+
+    def it_should_format_uuid_objects(self):
+        tests = (
+            (uuid.UUID('36980915-cd66-4547-9081-760ad0d77625'),
+             "<?xml version='1.0' encoding='UTF-8'?>\n"
+             '<document nodetype="uuid">'
+             '36980915-cd66-4547-9081-760ad0d77625</document>\n'),
+            )
+
+        self._format_each_should_equal(tests)
+
+    def it_should_not_check_strings_when_detection_is_disabled(self):
+        data = {
+            'a': '36980915-cd66-4547-9081-760ad0d77625',
+            'b': uuid.UUID('36980915-cd66-4547-9081-760ad0d77625'),
+            }
+
+        expected = ("<?xml version='1.0' encoding='UTF-8'?>\n<document>\n"
+                    "  <a>36980915-cd66-4547-9081-760ad0d77625</a>\n"
+                    '  <b nodetype="uuid">'
+                    '36980915-cd66-4547-9081-760ad0d77625</b>\n'
+                    '</document>\n')
+
+        self.assertEqual(
+            XMLEncoder(data, detect_uuids=False).to_string(), expected)
+        self.assertEqual(dumps(data, detect_uuids=False), expected)
+
+    def it_should_not_mark_strings_which_only_resemble_uuids(self):
+        tests = (
+            ('36980915-cd66-4547-9081-760ad0d7762z',
+             "<?xml version='1.0' encoding='UTF-8'?>\n"
+             '<document>36980915-cd66-4547-9081-760ad0d7762z</document>\n'),
+            ('{36980915-cd66-4547-9081-760ad0d77625\n',
+             "<?xml version='1.0' encoding='UTF-8'?>\n"
+             '<document>{36980915-cd66-4547-9081-760ad0d77625\n'
+             '</document>\n'),
+            ('36980915-cd66-4547-9081-760ad0d77625}\n',
+             "<?xml version='1.0' encoding='UTF-8'?>\n"
+             '<document>36980915-cd66-4547-9081-760ad0d77625}\n'
+             '</document>\n'),
             )
 
         self._format_each_should_equal(tests)
 
+    def it_should_read_back_the_strings_it_marks(self):
+        value = '{36980915-cd66-4547-9081-760ad0d77625}'
+
+        for profile in XMLEncoder._profiles:
+            self.assertEqual(loads(dumps({'a': value}, profile=profile)),
+                             {'a': uuid.UUID(value)})
+
+
+class TextBackendSpec(CommonBaseSpec):
+
+    def _values(self):
+        deep = []
+        for i in xrange(40):
+            deep = {'level': deep, 'i': i}
+
+        return [None, 0, u'caf\xe9', '', [], {}, True, 1.5, 10 ** 30,
+                [1, [2, [3]]], set([1]), (None, ''), PlainObject(),
+                {'a b': 1, u'\xe9t\xe9': 2, '_x': {}, 'list': ['', None]},
+                {'text': u'< & > " \' \r\n\t \U00010000'},
+                {'"&\t\n\r': 'name attribute'},
+                datetime.datetime(2010, 1, 1), uuid.uuid4(), deep]
+
+    def it_should_match_the_lxml_backend(self):
+        for data in self._values():
+            for options in ({}, {'encoding': 'ascii'},
+                            {'encoding': 'UTF-16'},
+                            {'attrib': {'b': '1', 'a': '"'}},
+                            {'nsmap': {'x': 'http://x'}}):
+                for indent in (True, False):
+                    for declaration in (True, False):
+                        self.assertEqual(
+                            XMLEncoder(data, backend='text', **options)
+                            .to_string(indent, declaration),
+                            XMLEncoder(data, **options)
+                            .to_string(indent, declaration))
+
+    def it_should_match_the_lxml_backend_when_streaming(self):
+        data = [{'n': i, 's': u'\xe9' * i} for i in xrange(3000)]
+
+        for options in ({}, {'encoding': 'UTF-16'}):
+            output = BytesIO()
+            dump(data, output, backend='text', **options)
+
+            self.assertEqual(output.getvalue(), dumps(data, **options))
+
+    def it_should_refuse_the_same_characters(self):
+        for data in ({'a': u'\x01'}, {'a\x01': 1}, {'a': {'b': u'\ufffe'}}):
+            self.assertRaises(ValueError,
+                              XMLEncoder(data).to_string)
+            self.assertRaises(ValueError,
+                              XMLEncoder(data, backend='text').to_string)
+
+    def it_should_reject_unknown_backends(self):
+        self.assertRaises(ValueError, XMLEncoder, None, backend='string')
+
+
+Point = namedtuple('Point', 'x y')
+
+
+class SlotsRecord(object):
+    __slots__ = ('name', 'size', '_cache')
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+
+class RecordEncoderSpec(CommonBaseSpec):
+
+    def _rows(self):
+        rows = [{'id': i, 'name': u'row %d' % i, 'ok': i % 2 == 0,
+                 'score': i / 2.0, 'note': None, '1st': 'x',
+                 'tags': ['a', i]}
+                for i in xrange(20)]
+        rows.append(dict(rows[0], id='not a number', extra=True))
+        rows.append({'other': 1})
+        return rows
+
+    def it_should_match_the_generic_output(self):
+        rows = self._rows()
+
+        for options in ({}, {'indent': False, 'doc_el': 'rows'},
+                        {'detect_uuids': False, 'declaration': False}):
+            encoder = RecordEncoder(rows[0], **options)
+            config = EncoderConfig(**options)
+
+            self.assertEqual(encoder.dumps(rows), config.dumps(rows))
+            self.assertEqual(encoder.dumps(tuple(rows)),
+                             config.dumps(tuple(rows)))
+
+    def it_should_match_the_generic_output_when_streaming(self):
+        rows = self._rows()
+        encoder = RecordEncoder(rows[0])
+        output = BytesIO()
+        encoder.dump(rows, output)
+
+        self.assertEqual(output.getvalue(), dumps(rows))
+
+    def it_should_encode_keys_in_any_order(self):
+        row = dict(('field%d' % i, i) for i in xrange(30))
+        rows = [dict(row, field0=i) for i in xrange(5)] + [row]
+
+        self.assertEqual(RecordEncoder(row).dumps(rows), dumps(rows))
+
+    def it_should_compile_from_a_slots_class(self):
+        rows = [SlotsRecord(u'a', 1), SlotsRecord('b', [1, 2]),
+                SlotsRecord(None, True), PlainObject()]
+
+        self.assertEqual(RecordEncoder(SlotsRecord).dumps(rows),
+                         dumps(rows))
+
+    def it_should_compile_from_a_namedtuple(self):
+        rows = [Point(1, u'a'), Point([2], None), (1, 2)]
+
+        self.assertEqual(RecordEncoder(Point).dumps(rows), dumps(rows))
+        self.assertEqual(RecordEncoder(rows[0]).dumps(rows), dumps(rows))
+
+    def it_should_compile_from_an_object(self):
+        sample = PlainObject()
+        sample.name = u'a'
+        sample._private = 1
+        rows = [sample, sample, PlainObject()]
+
+        self.assertEqual(RecordEncoder(sample).dumps(rows), dumps(rows))
+
+    def it_should_use_handlers_registered_after_encoding(self):
+        class NumberEncoder(XMLEncoder):
+            pass
+
+        rows = self._rows()
+        encoder = RecordEncoder(rows[0], cls=NumberEncoder)
+        encoder.dumps(rows)
+
+        NumberEncoder.register(int, lambda value: u'I%d' % value)
+        self.assertEqual(encoder.dumps(rows),
+                         dumps(rows, cls=NumberEncoder))
+
+        NumberEncoder.register(dict, lambda value: sorted(value))
+        self.assertEqual(encoder.dumps(rows),
+                         dumps(rows, cls=NumberEncoder))
+
+    def it_should_encode_empty_rows(self):
+        self.assertEqual(RecordEncoder({'a': 1}).dumps([]), dumps([]))
+
+    def it_should_reject_other_samples(self):
+        self.assertRaises(TypeError, RecordEncoder, [1, 2])
+        self.assertRaises(TypeError, RecordEncoder, dict)
+
+
+class ArraySpec(CommonBaseSpec):
+
+    def it_should_encode_arrays(self):
+        tests = (
+            (array('l', [1, -2, 3]),
+             "<?xml version='1.0' encoding='UTF-8'?>\n"
+             '<document nodetype="array" typecode="l">1 -2 3</document>\n'),
+            (array('d', [1.5, 2]),
+             "<?xml version='1.0' encoding='UTF-8'?>\n"
+             '<document nodetype="array" typecode="d">1.5 2.0</document>\n'),
+            (array('c', 'a <b>'),
+             "<?xml version='1.0' encoding='UTF-8'?>\n"
+             '<document nodetype="array" typecode="c">'
+             'a &lt;b&gt;</document>\n'),
+            ([array('i')],
+             "<?xml version='1.0' encoding='UTF-8'?>\n"
+             '<document nodetype="list">\n'
+             '  <i nodetype="array" typecode="i"></i>\n'
+             '</document>\n'),
+            )
+
+        self._format_each_should_equal(tests)
+
+    def it_should_encode_numpy_arrays(self):
+        if numpy is None:
+            raise SkipTest('numpy is not installed')
+
+        tests = (
+            (numpy.arange(6).reshape(2, 3).astype('int32'),
+             "<?xml version='1.0' encoding='UTF-8'?>\n"
+             '<document nodetype="array" dtype="int32" shape="2 3">'
+             '0 1 2 3 4 5</document>\n'),
+            (numpy.array([True, False]),
+             "<?xml version='1.0' encoding='UTF-8'?>\n"
+             '<document nodetype="array" dtype="bool">'
+             'true false</document>\n'),
+            (numpy.array(['a', 'b']),
+             "<?xml version='1.0' encoding='UTF-8'?>\n"
+             '<document nodetype="list">\n'
+             '  <i>a</i>\n'
+             '  <i>b</i>\n'
+             '</document>\n'),
+            (numpy.float64(1.5), XMLEncoder(1.5).to_string()),
+            (numpy.array(7), XMLEncoder(7).to_string()),
+            )
+
+        self._format_each_should_equal(tests)
+
+    def it_should_format_floats_like_scalars(self):
+        if numpy is None:
+            raise SkipTest('numpy is not installed')
+
+        values = [0.1, 1e-20, 1e20, 2.0 / 3]
+
+        self.assertEqual(
+            XMLEncoder(numpy.array(values)).to_xml().text,
+            ' '.join(XMLEncoder(value).to_xml().text for value in values))
+
+    def it_should_match_the_lxml_backend(self):
+        if numpy is None:
+            raise SkipTest('numpy is not installed')
+
+        data = {'a': numpy.zeros((3, 2)), 'b': array('u', u'\xe9')}
+
+        self.assertEqual(XMLEncoder(data, backend='text').to_string(),
+                         XMLEncoder(data).to_string())
+
+
+class Future(object):
+    """The parts of a future used by ``async_dump``."""
+
+    def __init__(self, result):
+        self._result = result
+
+    def add_done_callback(self, callback):
+        callback(self)
+
+    def result(self):
+        return self._result
+
+
+class Stream(object):
+    def __init__(self):
+        self.chunks = []
+        self.drained = 0
+
+    def write(self, chunk):
+        self.chunks.append(chunk)
+
+    def drain(self):
+        self.drained += 1
+        return Future(None)
+
+
+class AsyncDumpSpec(CommonBaseSpec):
+
+    def _run(self, coroutine):
+        """Runs ``coroutine`` as an event loop would, returning
+        the number of times it gave up control."""
+        pauses = 0
+        result = None
+
+        while True:
+            try:
+                yielded = coroutine.send(result)
+            except StopIteration:
+                return pauses
+
+            if yielded is None:
+                pauses += 1
+                result = None
+            else:
+                result = yielded.result()
+
+    def it_should_write_the_same_bytes_as_dumps(self):
+        tests = (
+            lambda: None,
+            lambda: [1, 2, 3],
+            lambda: {'foo': {'bar': 'baz'}, 'long title': '', 1: None},
+            lambda: {'a': (1, [True, False], set([1])), 'b': []},
+            lambda: (i for i in xrange(3)),
+            )
+
+        for test in tests:
+            for options in ({}, {'indent': False, 'declaration': False},
+                            {'encoding': 'UTF-16', 'doc_el': 'root'}):
+                stream = Stream()
+                self._run(async_dump(test(), stream, **options))
+
+                self.assertEqual(''.join(stream.chunks),
+                                 EncoderConfig(**options).dumps(test()))
+
+    def it_should_wait_for_futures(self):
+        data = {'a': Future(1), 'b': [Future(u'x'), Future(Future(None))],
+                'c': Future([Future(True)])}
+        stream = Stream()
+        self._run(async_dump(Future(data), stream))
+
+        self.assertEqual(''.join(stream.chunks),
+                         dumps({'a': 1, 'b': [u'x', None], 'c': [True]}))
+
+    def it_should_give_up_control_while_encoding(self):
+        data = [{'n': i} for i in xrange(5000)]
+        stream = Stream()
+        pauses = self._run(async_dump(data, stream, step=1000))
+
+        self.assertEqual(pauses, 10)
+        self.assertEqual(stream.drained, len(stream.chunks))
+        self.assertTrue(len(stream.chunks) > 10)
+        self.assertEqual(''.join(stream.chunks), dumps(data))
+
+    def it_should_write_to_a_callback(self):
+        chunks = []
+        self._run(async_dump({'a': 1}, chunks.append, indent=False))
+
+        self.assertEqual(''.join(chunks), dumps({'a': 1}, indent=False))
+
+    def it_should_run_as_a_tornado_coroutine(self):
+        try:
+            from tornado import concurrent, gen, ioloop
+        except ImportError:
+            raise SkipTest('tornado is not installed')
+
+        data = [{'n': i} for i in xrange(3000)]
+        chunks = []
+        loop = ioloop.IOLoop()
+
+        @gen.coroutine
+        def get():
+            rows = concurrent.Future()
+            loop.add_callback(rows.set_result, data)
+            # as documented in the README
+            yield gen.coroutine(async_dump)({'rows': rows}, chunks.append,
+                                            step=500)
+
+        loop.run_sync(get)
+        loop.close()
+
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(''.join(chunks), dumps({'rows': data}))
+
+
+class StatsSpec(CommonBaseSpec):
+
+    def _data(self):
+        sample = PlainObject()
+        sample.name = u'a'
+        return {'id': '6c8bfa0e-5f6a-4c3e-9c0e-2d9f6ab3a1f4', 'not a name': 1,
+                'slots': SlotsRecord(u'b', [1, 2]), 'object': sample,
+                'deep': [[[None, True]]]}
+
+    def it_should_count_elements_and_branches(self):
+        stats = EncoderStats()
+        output = XMLEncoder(self._data(), stats=stats).to_string()
+
+        self.assertEqual(output, XMLEncoder(self._data()).to_string())
+        self.assertEqual(stats.documents, 1)
+        self.assertEqual(stats.elements, 16)
+        self.assertEqual(stats.max_depth, 4)
+        self.assertTrue(stats.encode_time > 0)
+        self.assertTrue(stats.serialize_time > 0)
+
+        branches = stats.branches
+        self.assertEqual(branches['slots'][0], 1)
+        self.assertEqual(branches['object'][0], 1)
+        self.assertEqual(branches['list'][0], 4)
+        self.assertEqual(branches['uuid_sniff'][0], 1)
+        self.assertTrue('unsupported' not in branches)
+
+    def it_should_count_names_whether_or_not_they_were_seen_before(self):
+        # the elements for the keys are cached by the first, if no
+        # other encoder has already
+        for _ in range(2):
+            stats = EncoderStats()
+            XMLEncoder(self._data(), stats=stats).to_string()
+
+            self.assertEqual(stats.branches['element_name'][0], 5)
+            self.assertEqual(stats.branches['invalid_name'][0], 1)
+
+    def it_should_count_every_way_of_encoding(self):
+        data = self._data()
+        stats = EncoderStats()
+
+        for backend in XMLEncoder._backends:
+            encoder = XMLEncoder(data, backend=backend, stats=stats)
+            encoder.to_string()
+            encoder.dump(BytesIO())
+            ''.join(encoder.iterencode())
+        self._run(async_dump(data, BytesIO(), stats=stats))
+        dumps(data, stats=stats)
+
+        self.assertEqual(stats.documents, 8)
+        self.assertEqual(stats.elements, 8 * 16)
+
+    def _run(self, coroutine):
+        for _ in coroutine:
+            pass
+
+    def it_should_export_plain_values(self):
+        stats = EncoderStats()
+        dumps(self._data(), stats=stats)
+        exported = stats.as_dict()
+
+        self.assertEqual(exported['elements'], 16)
+        self.assertEqual(exported['branches']['boolean']['hits'], 1)
+
+        stats.reset()
+        self.assertEqual((stats.documents, stats.elements, stats.branches),
+                         (0, 0, {}))
+
+        dumps([1], stats=stats)
+        self.assertEqual(stats.branches['scalar'][0], 1)
+
+    def it_should_leave_other_encoders_alone(self):
+        XMLEncoder([1], stats=EncoderStats()).to_string()
+
+        self.assertTrue(all(getattr(handler, '__name__', '') != 'measured'
+                            for handler in XMLEncoder._dispatch.values()))
+
+
+class FragmentCacheSpec(CommonBaseSpec):
+
+    table = tuple((i, u'row & %d' % i, i * 0.5, i % 2 == 0, None)
+                  for i in range(10))
+
+    def _data(self):
+        return {'table': self.table, 'nested': [{'table': self.table}],
+                'rows': tuple([{'id': 1}] * 8), 'short': (1, 2)}
+
+    def it_should_splice_the_same_output(self):
+        expected = XMLEncoder(self._data()).to_string()
+
+        for backend in XMLEncoder._backends:
+            for indent in (True, False):
+                cache = FragmentCache()
+                for _ in range(2):
+                    encoder = XMLEncoder(self._data(), backend=backend,
+                                         fragment_cache=cache)
+                    self.assertEqual(
+                        encoder.to_string(indent),
+                        XMLEncoder(self._data()).to_string(indent))
+
+                self.assertTrue(cache.hits > 0)
+
+        cache = FragmentCache()
+        config = EncoderConfig(fragment_cache=cache)
+        self.assertEqual(config.dumps(self._data()), expected)
+        self.assertEqual(''.join(config.iterencode(self._data(), 64)),
+                         expected)
+
+    def it_should_find_equal_values_by_what_they_hold(self):
+        cache = FragmentCache()
+        dumps(self.table, fragment_cache=cache)
+        dumps(tuple(list(self.table)), fragment_cache=cache)
+
+        # the rows are shorter than min_size, so aren't cached
+        self.assertEqual((cache.misses, cache.hits), (1, 1))
+        self.assertEqual(cache.hit_rate, 0.5)
+
+        dumps((1, 2, 3, 4, 5, 6, 7, True), fragment_cache=cache)
+        dumps((1, 2, 3, 4, 5, 6, 7, 1), fragment_cache=cache)
+        self.assertEqual(cache.misses, 3)
+
+    def it_should_find_other_values_by_identity(self):
+        cache = FragmentCache()
+        rows = tuple([{'id': 1}] * 8)
+        dumps(rows, fragment_cache=cache)
+        dumps(rows, fragment_cache=cache)
+        dumps(tuple(rows), fragment_cache=cache)
+        dumps(tuple([{'id': 1}] * 8), fragment_cache=cache)
+
+        self.assertEqual((cache.misses, cache.hits), (2, 2))
+
+    def it_should_keep_to_its_budget(self):
+        cache = FragmentCache(maxbytes=600, min_size=1)
+        for i in range(20):
+            dumps((i, u'value %d' % i), fragment_cache=cache)
+
+        self.assertTrue(cache.size <= 600)
+        self.assertTrue(cache.evictions > 0)
+        self.assertEqual(len(cache), 20 - cache.evictions)
+
+        cache.clear()
+        self.assertEqual((len(cache), cache.size, cache.evictions), (0, 0, 0))
+
+
+class ReferenceSpec(CommonBaseSpec):
+
+    def it_should_encode_shared_values_once(self):
+        shared = ['a']
+        data = [shared, 'a', shared]
+
+        expected = (
+            '<?xml version=\'1.0\' encoding=\'UTF-8\'?>\n'
+            '<document id="1" nodetype="list">\n'
+            '  <i id="2" nodetype="list">\n'
+            '    <i>a</i>\n'
+            '  </i>\n'
+            '  <i>a</i>\n'
+            '  <i nodetype="reference" idref="2"/>\n'
+            '</document>\n')
+
+        for backend in XMLEncoder._backends:
+            encoder = XMLEncoder(data, backend=backend, references=True)
+            self.assertEqual(encoder.to_string(), expected)
+
+            output = BytesIO()
+            encoder.dump(output)
+            self.assertEqual(output.getvalue(), expected)
+
+        self.assertEqual(dumps(data, references=True), expected)
+        self.assertEqual(XMLEncoder(data).to_string().count('<i>a</i>'), 3)
+
+    def it_should_encode_values_containing_themselves(self):
+        parent = PlainObject()
+        parent.children = [parent]
+
+        expected = (
+            '<?xml version=\'1.0\' encoding=\'UTF-8\'?>\n'
+            '<document id="1">\n'
+            '  <PlainObject nodetype="container">\n'
+            '    <children id="2" nodetype="list">\n'
+            '      <i nodetype="reference" idref="1"/>\n'
+            '    </children>\n'
+            '  </PlainObject>\n'
+            '</document>\n')
+
+        self.assertEqual(dumps(parent, references=True), expected)
+        self.assertEqual(''.join(EncoderConfig(references=True).iterencode(
+            parent)), expected)
+
+    def it_should_number_each_document_separately(self):
+        config = EncoderConfig(references=True)
+        data = [[1]]
+
+        self.assertEqual(config.dumps(data), config.dumps(data))
+
+    def it_should_match_for_records(self):
+        row = {'id': 1, 'tags': [u'a']}
+        encoder = RecordEncoder(row, references=True)
+        output = encoder.dumps([row, row])
+
+        self.assertEqual(output, dumps([row, row], references=True))
+        self.assertTrue('idref' in output)
+
+        rows = loads(output)
+        self.assertTrue(rows[0] is rows[1])
+
+    def it_should_refuse_a_fragment_cache(self):
+        self.assertRaises(ValueError, XMLEncoder, [], references=True,
+                          fragment_cache=FragmentCache())
+
+
+class ParseSpec(CommonBaseSpec):
+
+    def _parsed(self, method, source, **params):
+        encoder = XMLEncoder(None)
+        getattr(encoder, method)(source, **params)
+        return encoder.to_string()
+
+    def it_should_parse_buffers(self):
+        string = dumps({'a': [1, 2], 'b': u'caf\xe9'})
+        expected = self._parsed('from_string', string)
+
+        for buffer in (string, bytearray(string), binary_view(string)):
+            self.assertEqual(self._parsed('from_buffer', buffer), expected)
+
+        self.assertEqual(self._parsed('from_buffer', string, huge_tree=True),
+                         expected)
+
+    def it_should_parse_arrays(self):
+        string = dumps(range(20000), indent=False)
+        expected = self._parsed('from_string', string)
+
+        for typecode in ('c', 'B'):
+            self.assertEqual(self._parsed('from_buffer',
+                                          array(typecode, string)),
+                             expected)
+
+    def it_should_parse_files_and_mmaps(self):
+        string = dumps(range(20000), indent=False)
+        expected = self._parsed('from_string', string)
+
+        handle, path = tempfile.mkstemp()
+        try:
+            os.write(handle, string)
+            self.assertEqual(self._parsed('from_file', path), expected)
+
+            mapped = mmap.mmap(handle, 0, access=mmap.ACCESS_READ)
+            try:
+                self.assertEqual(self._parsed('from_buffer', mapped),
+                                 expected)
+                self.assertEqual(self._parsed('from_file', mapped),
+                                 expected)
+            finally:
+                mapped.close()
+        finally:
+            os.close(handle)
+            os.remove(path)
+
+
+class CompressionSpec(CommonBaseSpec):
+
+    def _decompress(self, compression, output):
+        if compression == 'gzip':
+            return gzip.GzipFile(fileobj=BytesIO(output)).read()
+        return bz2.decompress(output)
+
+    def it_should_dump_compressed_output(self):
+        data = [{'a': i, 'b': u'caf\xe9'} for i in xrange(1000)]
+
+        for backend in XMLEncoder._backends:
+            encoder = XMLEncoder(data, backend=backend)
+            expected = encoder.to_string()
+
+            for compression in ('gzip', 'bz2'):
+                output = BytesIO()
+                encoder.dump(output, compression=compression,
+                             compresslevel=1)
+                self.assertTrue(len(output.getvalue()) < len(expected))
+                self.assertEqual(
+                    self._decompress(compression, output.getvalue()),
+                    expected)
+
+    def it_should_iterencode_compressed_chunks(self):
+        config = EncoderConfig(indent=False)
+        data = range(10000)
+
+        for compression in ('gzip', 'bz2'):
+            output = ''.join(config.iterencode(data, chunk_size=1024,
+                                               compression=compression))
+            self.assertEqual(self._decompress(compression, output),
+                             config.dumps(data))
+
+    def it_should_dump_to_a_compressed_file(self):
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            dump({'a': 1}, path, compression='gzip')
+            f = gzip.open(path, 'rb')
+            try:
+                self.assertEqual(f.read(), dumps({'a': 1}))
+            finally:
+                f.close()
+        finally:
+            os.remove(path)
+
+    def it_should_refuse_an_unknown_compression(self):
+        self.assertRaises(ValueError, XMLEncoder([]).dump, BytesIO(),
+                          compression='zip')
+        self.assertRaises(ValueError, XMLEncoder([]).iterencode,
+                          compression='zip')
+
+
+class CompactProfileSpec(CommonBaseSpec):
+
+    def it_should_write_fields_as_attributes(self):
+        data = {'a': 1, 'b': True, 'c': [1, 2.5], 'd': ['x'], 't': 'y'}
+
+        expected = (
+            '<?xml version=\'1.0\' encoding=\'UTF-8\'?>\n'
+            '<document profile="compact" a="1">'
+            '<c t="L">1 2.5</c>'
+            '<b t="b">1</b>'
+            '<d t="l"><i>x</i></d>'
+            '<t>y</t>'
+            '</document>')
+
+        for backend in XMLEncoder._backends:
+            encoder = XMLEncoder(data, backend=backend, profile='compact')
+            self.assertEqual(encoder.to_string(), expected)
+
+            output = BytesIO()
+            encoder.dump(output)
+            self.assertEqual(output.getvalue(), expected)
+
+        self.assertEqual(dumps(data, profile='compact'), expected)
+
+    def it_should_be_smaller_than_the_standard_profile(self):
+        data = [{'id': i, 'name': u'row %d' % i, 'tags': (1, 2)}
+                for i in xrange(100)]
+
+        self.assertTrue(len(dumps(data, profile='compact')) * 2
+                        < len(dumps(data)))
+
+    def it_should_match_for_records(self):
+        rows = [{'id': 1, 'name': u'a'}, {'id': 2, 'name': u'b'}]
+        encoder = RecordEncoder(rows[0], profile='compact')
+
+        self.assertEqual(encoder.dumps(rows), dumps(rows, profile='compact'))
+
+    def it_should_refuse_an_unknown_profile(self):
+        self.assertRaises(ValueError, XMLEncoder, [], profile='tiny')
+
+
+class CanonicalSpec(CommonBaseSpec):
+
+    def _data(self, keys):
+        obj = PlainObject()
+        for key in keys:
+            setattr(obj, key.encode('unicode_escape'), key)
+
+        return {'map': dict((key, key * 2) for key in keys),
+                'set': set(keys + [1, 2.5, (1, 2)]),
+                'names': frozenset(keys),
+                'obj': obj}
+
+    def it_should_write_equal_data_the_same_way(self):
+        keys = ['k%d' % i for i in range(20)] + [u'\xe8', u'a b']
+        first = self._data(keys)
+        second = self._data(list(reversed(keys)))
+
+        for backend in XMLEncoder._backends:
+            for profile in XMLEncoder._profiles:
+                outputs = [XMLEncoder(data, backend=backend, profile=profile,
+                                      canonical=True).to_string()
+                           for data in (first, second)]
+                self.assertEqual(outputs[0], outputs[1])
+
+    def it_should_sort_keys_and_members(self):
+        expected = (
+            '<?xml version=\'1.0\' encoding=\'UTF-8\'?>\n'
+            '<document><a>2</a><b nodetype="unique-list">'
+            '<i>1</i><i>2</i><i>3</i></b></document>')
+
+        self.assertEqual(dumps({'b': set([3, 1, 2]), 'a': 2}, indent=False,
+                               canonical=True), expected)
+
+    def it_should_fingerprint_the_output(self):
+        keys = ['k%d' % i for i in range(20)]
+        config = EncoderConfig(canonical=True)
+        fingerprint = config.fingerprint(self._data(keys))
+
+        self.assertEqual(len(fingerprint), 40)
+        self.assertEqual(
+            config.fingerprint(self._data(list(reversed(keys)))),
+            fingerprint)
+        self.assertEqual(
+            XMLEncoder(self._data(keys), canonical=True).fingerprint(),
+            fingerprint)
+
+        self.assertNotEqual(config.fingerprint({'a': 1}),
+                            config.fingerprint({'a': 1.0}))
+        self.assertNotEqual(XMLEncoder({'a': 1}, canonical=True)
+                            .fingerprint(indent=False),
+                            config.fingerprint({'a': 1}))
+
+        # iterators can't be read without being used up
+        self.assertEqual(config.fingerprint(iter([1, 2])), None)
+        self.assertRaises(ValueError, EncoderConfig().fingerprint, {})
+
+    def it_should_fingerprint_the_values_handlers_return(self):
+        class MoneyEncoder(XMLEncoder):
+            pass
+
+        MoneyEncoder.register(Money, lambda value: {'amount': value.amount})
+
+        fingerprints = [
+            MoneyEncoder([Money(1, 'EUR'), Money(amount, 'EUR')],
+                         canonical=True, references=True).fingerprint()
+            for amount in (2, 3)]
+        self.assertNotEqual(fingerprints[0], fingerprints[1])
+
+    def it_should_fingerprint_deeply_nested_data(self):
+        def nested(leaf):
+            data = leaf
+            for i in xrange(sys.getrecursionlimit() * 2):
+                data = [data] if i % 2 else {'a': data}
+            return data
+
+        config = EncoderConfig(canonical=True)
+        fingerprint = config.fingerprint(nested(1))
+
+        self.assertEqual(len(fingerprint), 40)
+        self.assertEqual(config.fingerprint(nested(1)), fingerprint)
+        self.assertNotEqual(config.fingerprint(nested(2)), fingerprint)
+
+    def it_should_return_cached_output(self):
+        cache = OutputCache()
+        keys = ['k%d' % i for i in range(20)]
+
+        for backend in XMLEncoder._backends:
+            first = XMLEncoder(self._data(keys), backend=backend,
+                               canonical=True, output_cache=cache)
+            second = XMLEncoder(self._data(list(reversed(keys))),
+                                backend=backend, canonical=True,
+                                output_cache=cache)
+
+            output = first.to_string()
+            self.assertTrue(second.to_string() is output)
+            self.assertEqual(output, XMLEncoder(
+                self._data(keys), canonical=True).to_string())
+
+        self.assertEqual((cache.misses, cache.hits), (1, 3))
+
+        self.assertEqual(dumps(iter([1, 2]), canonical=True,
+                               output_cache=cache),
+                         dumps([1, 2], canonical=True).replace(
+                             'list', 'generated-list'))
+        self.assertEqual(len(cache), 1)
+
+    def it_should_keep_to_its_budget(self):
+        cache = OutputCache(maxbytes=600)
+        for i in range(20):
+            dumps({'value': i}, canonical=True, output_cache=cache)
+
+        self.assertTrue(cache.size <= 600)
+        self.assertTrue(cache.evictions > 0)
+        self.assertEqual(len(cache), 20 - cache.evictions)
+
+    def it_should_need_canonical_output_for_a_cache(self):
+        self.assertRaises(ValueError, XMLEncoder, [],
+                          output_cache=OutputCache())
+
 
 class UnsupportedFormatSpec(CommonBaseSpec):
 
     def it_should_raise_for_unsupported_formats(self):
         data = {
-            'file': tempfile.TemporaryFile()
+            'object': object()
             }
 
         self.assertRaises(
@@ -342,10 +1685,10 @@ class UnsupportedFormatSpec(CommonBaseSpec):
     def it_should_skip_errors(self):
         """it should not raise on skip_errors"""
         tests = (
-            ({'file': tempfile.TemporaryFile()},
+            ({'object': object()},
              '<?xml version=\'1.0\' encoding=\'UTF-8\'?>\n<document>\n  '
-             '<file nodetype="unsupported-type">&lt;type \'file\'&gt;</file>'
-             '\n</document>\n'),
+             '<object nodetype="unsupported-type">&lt;type \'object\'&gt;'
+             '</object>\n</document>\n'),
             )
 
         self._format_each_should_equal(tests)
@@ -0,0 +1,324 @@
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+import uuid
+from array import array
+
+from nose.plugins.skip import SkipTest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from io import BytesIO  # python 3
+except ImportError:
+    from cStringIO import StringIO as BytesIO  # python 2
+
+BASE_PATH = '/'.join(os.path.dirname(
+    os.path.abspath(__file__)).split('/')[0:-1])
+
+if BASE_PATH not in sys.path:
+    sys.path.insert(1, BASE_PATH)
+
+from exemelopy import *
+
+
+class PlainObject(object):
+    pass
+
+
+class CommonDecoderSpec(unittest.TestCase):
+    def _round_trip_each_should_equal(self, items):
+        for test, expected in items:
+            for indent in (True, False):
+                output = loads(XMLEncoder(test).to_string(indent=indent))
+                self.assertEqual(output, expected)
+
+
+class DecoderSpec(CommonDecoderSpec):
+
+    def it_should_decode_simple_items(self):
+        tests = (
+            (None, None),
+            ('test', u'test'),
+            (u'\xe9t\xe9', u'\xe9t\xe9'),
+            ('  < & >  ', u'  < & >  '),
+            (123, u'123'),
+            (True, True),
+            (False, None),
+            )
+
+        self._round_trip_each_should_equal(tests)
+
+    def it_should_decode_lists(self):
+        tests = (
+            (['a', 'b', None], [u'a', u'b', None]),
+            (set(['a', 'b']), set([u'a', u'b'])),
+            (('a', 'b'), (u'a', u'b')),
+            ([[], ['a', ()]], [[], [u'a', ()]]),
+            )
+
+        self._round_trip_each_should_equal(tests)
+
+    def it_should_decode_sets_within_sets_and_tuples(self):
+        tests = (
+            (set([frozenset([1])]), set([frozenset([u'1'])])),
+            (set([(frozenset([1]),)]), set([(frozenset([u'1']),)])),
+            ((set(['a']),), (frozenset([u'a']),)),
+            )
+
+        self._round_trip_each_should_equal(tests)
+
+        for profile in XMLEncoder._profiles:
+            self.assertEqual(
+                loads(dumps(set([frozenset([1, 2])]), profile=profile)),
+                set([frozenset([u'1', u'2'])]))
+
+    def it_should_decode_generated_lists(self):
+        self.assertEqual(loads(XMLEncoder(i for i in 'ab').to_string()),
+                         [u'a', u'b'])
+
+    def it_should_decode_mappings(self):
+        tests = (
+            ({'a': 'b', 'c': {'d': [True, False]}},
+             {u'a': u'b', u'c': {u'd': [True, False]}}),
+            ({'long title': 'x', 1: 'y', '_id': 'z'},
+             {u'long title': u'x', u'1': u'y', u'_id': u'z'}),
+            ({'node': 'x'}, {u'node': u'x'}),
+            )
+
+        self._round_trip_each_should_equal(tests)
+
+    def it_should_decode_objects_as_mappings(self):
+        test_object = PlainObject()
+        test_object.bar = 'baz'
+
+        tests = (
+            (test_object, {u'PlainObject': {u'bar': u'baz'}}),
+            )
+
+        self._round_trip_each_should_equal(tests)
+
+    def it_should_decode_uuids(self):
+        value = uuid.UUID('36980915-cd66-4547-9081-760ad0d77625')
+
+        tests = (
+            (value, value),
+            ('{36980915-cd66-4547-9081-760ad0d77625}', value),
+            )
+
+        self._round_trip_each_should_equal(tests)
+
+    def it_should_decode_timestamps(self):
+        tests = (
+            (datetime.datetime(2010, 2, 1, 0, 0),
+             datetime.datetime(2010, 2, 1, 0, 0)),
+            (datetime.datetime(2010, 2, 1, 12, 30, 15, 120),
+             datetime.datetime(2010, 2, 1, 12, 30, 15, 120)),
+            (datetime.date(2002, 3, 11), datetime.date(2002, 3, 11)),
+            (datetime.time(9, 45), datetime.time(9, 45)),
+            )
+
+        self._round_trip_each_should_equal(tests)
+
+    def it_should_decode_timestamps_with_offsets(self):
+        value = loads('<document nodetype="timestamp">'
+                      '2010-02-01T12:00:00-01:30</document>')
+
+        self.assertEqual(value.utcoffset(),
+                         datetime.timedelta(hours=-1, minutes=-30))
+        self.assertEqual(value.replace(tzinfo=None),
+                         datetime.datetime(2010, 2, 1, 12))
+
+    def it_should_decode_unicode_strings(self):
+        self.assertEqual(
+            loads(XMLEncoder([u'\xe9']).to_string().decode('utf-8')),
+            [u'\xe9'])
+
+    def it_should_decode_other_encodings(self):
+        self.assertEqual(
+            loads(XMLEncoder([u'\xe9'], encoding='iso-8859-1').to_string()),
+            [u'\xe9'])
+
+    def it_should_decode_arrays(self):
+        tests = (
+            (array('l', [1, -2]), array('l', [1, -2])),
+            (array('d', [0.1, 2]), array('d', [0.1, 2])),
+            (array('c', 'a <b>'), array('c', 'a <b>')),
+            (array('u', u'\xe9 '), array('u', u'\xe9 ')),
+            ([array('f')], [array('f')]),
+            )
+
+        self._round_trip_each_should_equal(tests)
+
+    def it_should_decode_numpy_arrays(self):
+        if numpy is None:
+            raise SkipTest('numpy is not installed')
+
+        for value in (numpy.arange(6).reshape(3, 2),
+                      numpy.array([0.1, 1e20], dtype='float32'),
+                      numpy.array([True, False]),
+                      numpy.array([1 + 2j]),
+                      numpy.zeros((0, 2))):
+            output = loads(XMLEncoder({'value': value}).to_string())['value']
+
+            self.assertEqual(output.dtype, value.dtype)
+            self.assertEqual(output.shape, value.shape)
+            self.assertTrue((output == value).all())
+
+
+class BinaryDecoderSpec(unittest.TestCase):
+
+    def it_should_restore_the_bytes_of_binary_values(self):
+        payload = os.urandom(100000)
+
+        for profile in XMLEncoder._profiles:
+            xml = dumps({'a': bytearray(payload), 'b': bytearray()},
+                        profile=profile)
+            self.assertEqual(loads(xml), {u'a': payload, u'b': ''})
+
+
+class ReferenceDecoderSpec(unittest.TestCase):
+
+    def _round_trip(self, data):
+        return loads(XMLEncoder(data, references=True).to_string())
+
+    def it_should_restore_shared_values(self):
+        shared = {'a': [1]}
+        output = self._round_trip([shared, (shared, shared), {'b': shared}])
+
+        self.assertEqual(output[0], {u'a': [u'1']})
+        self.assertTrue(output[0] is output[1][0] is output[1][1]
+                        is output[2][u'b'])
+
+    def it_should_restore_values_containing_themselves(self):
+        parent = PlainObject()
+        child = PlainObject()
+        parent.children = [child]
+        child.parent = parent
+        data = {'items': []}
+        data['items'].append(data)
+
+        output = self._round_trip(parent)
+        self.assertTrue(output[u'PlainObject'][u'children'][0]
+                        [u'PlainObject'][u'parent'] is output)
+
+        output = self._round_trip(data)
+        self.assertTrue(output[u'items'][0] is output)
+
+    def it_should_leave_references_it_cannot_fill_in_as_none(self):
+        data = []
+        data.append((data, 0))
+        self.assertEqual(self._round_trip(data), [(None, u'0')])
+
+        shared = {'a': None}
+        self.assertEqual(
+            list(load_iter(BytesIO(XMLEncoder(
+                [shared, shared], references=True).to_string()))),
+            [{u'a': None}, {u'a': None}])
+
+
+class CompactDecoderSpec(unittest.TestCase):
+
+    def it_should_read_the_same_values_as_the_standard_profile(self):
+        data = {
+            'int': 1,
+            'string': u'caf\xe9 <&>',
+            'empty': '',
+            'bool': False,
+            'none': None,
+            'uuid': uuid.UUID(int=1),
+            'date': datetime.date(2020, 1, 2),
+            'numbers': (1, 2.5),
+            'set': set(['a']),
+            'nested': [{'id': 1, 't': 'reserved', '1st': 'invalid'}],
+            'object': PlainObject(),
+            }
+        standard = loads(XMLEncoder(data).to_string())
+
+        for backend in XMLEncoder._backends:
+            output = loads(XMLEncoder(data, backend=backend,
+                                      profile='compact').to_string())
+            self.assertEqual(output, standard)
+
+    def it_should_read_keys_reserved_by_xml(self):
+        data = {'xmlns': u'urn:a', 'XMLData': 1, 'xml': u'x', 'a': u'b'}
+        output = dumps(data, profile='compact')
+
+        self.assertFalse('xmlns=' in output)
+        self.assertEqual(loads(output), {u'xmlns': u'urn:a', u'XMLData': u'1',
+                                         u'xml': u'x', u'a': u'b'})
+
+    def it_should_restore_references(self):
+        shared = {'a': 1}
+        output = loads(dumps([shared, shared], references=True,
+                             profile='compact'))
+
+        self.assertEqual(output, [{u'a': u'1'}, {u'a': u'1'}])
+        self.assertTrue(output[0] is output[1])
+
+    def it_should_stream_fields_and_packed_items(self):
+        output = list(load_iter(BytesIO(dumps({'a': 1, 'b': [2]},
+                                              profile='compact'))))
+        self.assertEqual(sorted(output), [(u'a', u'1'), (u'b', [u'2'])])
+
+        output = list(load_iter(BytesIO(dumps([1, 2], profile='compact'))))
+        self.assertEqual(output, [u'1', u'2'])
+
+
+class StreamingDecoderSpec(unittest.TestCase):
+
+    def _source(self, data):
+        return BytesIO(XMLEncoder(data).to_string())
+
+    def it_should_yield_list_items(self):
+        items = load_iter(self._source(['a', {'b': [True]}, None]))
+
+        self.assertEqual(items.next(), u'a')
+        self.assertEqual(list(items), [{u'b': [True]}, None])
+
+    def it_should_yield_mapping_entries(self):
+        data = {'a': 'b', 'long title': (1, 2)}
+
+        self.assertEqual(sorted(load_iter(self._source(data))),
+                         [(u'a', u'b'), (u'long title', (u'1', u'2'))])
+
+    def it_should_yield_nothing_for_empty_documents(self):
+        self.assertEqual(list(load_iter(self._source([]))), [])
+        self.assertEqual(list(load_iter(self._source(None))), [])
+
+    def it_should_read_from_filenames(self):
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            XMLEncoder(i for i in xrange(3)).dump(path)
+            self.assertEqual(list(load_iter(path)), [u'0', u'1', u'2'])
+            self.assertEqual(load(path), [u'0', u'1', u'2'])
+        finally:
+            os.remove(path)
+
+    def it_should_read_compressed_documents(self):
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            for compression in ('gzip', 'bz2'):
+                XMLEncoder([{'a': 1}, 2]).dump(path, compression=compression)
+                self.assertEqual(list(load_iter(path,
+                                                compression=compression)),
+                                 [{u'a': u'1'}, u'2'])
+                with open(path, 'rb') as f:
+                    self.assertEqual(load(f, compression=compression),
+                                     [{u'a': u'1'}, u'2'])
+                    f.seek(0)
+                    self.assertEqual(loads(f.read(),
+                                           compression=compression),
+                                     [{u'a': u'1'}, u'2'])
+        finally:
+            os.remove(path)
+
+    def it_should_load_file_objects(self):
+        self.assertEqual(load(self._source({'a': [True]})), {u'a': [True]})